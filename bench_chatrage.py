@@ -0,0 +1,321 @@
+"""Бенчмарки горячих путей узла ChatRage.
+
+Генерирует синтетические цепочки заданного размера (по числу транзакций) и
+замеряет proof_of_work, valid_chain, пересчет состояния, запросы баланса и
+rage-индекса, сохранение и загрузку цепочки, а также пропускную способность
+/transactions/new через тестовый клиент Flask. Результат - JSON с
+отсортированными ключами, чтобы прогоны разных коммитов можно было сравнивать:
+
+    python bench_chatrage.py --sizes 10k,100k,1m --output bench_output.txt
+    python bench_chatrage.py --sizes 10k --compare bench_output.txt
+"""
+import gc
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from chatrage_merkle import merkle_root
+from chatrage_mining import ProcessPoolMiner, TightLoopMiner, create_miner
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+TXS_PER_BLOCK = 2000
+ADDRESS_COUNT = 1000
+QUERY_COUNT = 2000
+# Исторический баланс переигрывает блоки от ближайшего снимка, поэтому запросов меньше
+HISTORICAL_QUERY_COUNT = 100
+API_TRANSACTIONS = 2000
+SEED = 1337
+
+
+def measure(func, repeat=3):
+    """Запускает func repeat раз; возвращает лучшее и медианное время в секундах."""
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {'best': min(runs), 'median': statistics.median(runs), 'runs': repeat}
+
+
+class ProofSequence:
+    """Proof каждого блока зависит только от proof предыдущего, поэтому последовательность
+    считается один раз и переиспользуется для всех размеров цепочек."""
+
+    def __init__(self, miner):
+        self.miner = miner
+        self.proofs = [1]
+
+    def get(self, count):
+        while len(self.proofs) < count:
+            self.proofs.append(self.miner.mine(self.proofs[-1]).proof)
+        return self.proofs[:count]
+
+
+def generate_transactions(rng, count, addresses, open_reports):
+    transactions = []
+    for _ in range(count):
+        roll = rng.random()
+        sender = rng.choice(addresses)
+        if roll < 0.70:
+            transactions.append({'sender': sender, 'recipient': rng.choice(addresses),
+                                 'amount': rng.randint(1, 100), 'type': 'transfer', 'data': None})
+        elif roll < 0.80:
+            transactions.append({'sender': sender, 'recipient': 'RAGE_Staking_Pool',
+                                 'amount': rng.randint(1, 20), 'type': 'stake', 'data': None})
+        elif roll < 0.85:
+            transactions.append({'sender': 'RAGE_Staking_Pool', 'recipient': sender,
+                                 'amount': rng.randint(1, 5), 'type': 'unstake', 'data': None})
+        elif roll < 0.90 or not open_reports:
+            report_id = '%032x' % rng.getrandbits(128)
+            transactions.append({'sender': sender, 'recipient': 'Rage_Protocol', 'amount': 0,
+                                 'type': 'rage_report', 'data': {
+                                     'report_id': report_id,
+                                     'content_hash': '%064x' % rng.randrange(ADDRESS_COUNT * 10),
+                                     'reason_code': rng.choice(['SPAM', 'HATE', 'SCAM']),
+                                     'timestamp': 0.0,
+                                     'reporter_address': sender,
+                                     'stake_amount': 0}})
+            open_reports.append(report_id)
+        else:
+            transactions.append({'sender': sender, 'recipient': 'Rage_Protocol', 'amount': 0,
+                                 'type': 'vote_rage_report', 'data': {
+                                     'report_id': rng.choice(open_reports[-500:]),
+                                     'voter_address': sender,
+                                     'vote_type': rng.choice(['approve', 'reject'])}})
+    return transactions
+
+
+def generate_chain(blockchain_cls, tx_count, proof_sequence, txs_per_block=TXS_PER_BLOCK, seed=SEED):
+    """Синтетическая валидная цепочка: генезис и блоки по txs_per_block транзакций."""
+    rng = random.Random(seed)
+    addresses = ['addr_%04d' % i for i in range(ADDRESS_COUNT)]
+    block_count = math.ceil(tx_count / txs_per_block)
+    proofs = proof_sequence.get(block_count + 1)
+    genesis = {'index': 1, 'timestamp': 0.0, 'transactions': [], 'proof': proofs[0], 'previous_hash': '1'}
+    chain = [genesis]
+    hashes = [blockchain_cls.hash(genesis)]
+    open_reports = []
+    remaining = tx_count
+    for position in range(1, block_count + 1):
+        transactions = generate_transactions(rng, min(txs_per_block, remaining), addresses, open_reports)
+        block = {
+            'index': position + 1,
+            'timestamp': float(position),
+            'transactions': transactions,
+            'merkle_root': merkle_root(transactions),
+            'proof': proofs[position],
+            'previous_hash': hashes[-1]
+        }
+        remaining -= len(block['transactions'])
+        chain.append(block)
+        hashes.append(blockchain_cls.hash(block))
+    return chain, hashes, addresses, open_reports
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def bench_chain(coin, label, tx_count, proof_sequence, repeat):
+    blockchain_cls = coin.ChatRageBlockchain
+    started = time.perf_counter()
+    chain, hashes, addresses, reports = generate_chain(blockchain_cls, tx_count, proof_sequence)
+    result = {
+        'transactions': tx_count,
+        'blocks': len(chain),
+        'generate_seconds': time.perf_counter() - started
+    }
+
+    node_id = f'bench_{label}'
+    shutil.rmtree(coin.CHAIN_DATA_DIR, ignore_errors=True)
+    node = blockchain_cls(node_id)
+    node.chain = chain
+    node.block_hashes = hashes
+
+    result['hash_blocks'] = measure(lambda: [blockchain_cls.hash(block) for block in chain], repeat)
+    result['valid_chain'] = measure(lambda: node.valid_chain(chain, hashes), repeat)
+    result['recalculate_states'] = measure(node._recalculate_states_from_chain, repeat)
+
+    rng = random.Random(SEED)
+    queries = [rng.choice(addresses) for _ in range(QUERY_COUNT)]
+    heights = [rng.randint(1, len(chain)) for _ in range(HISTORICAL_QUERY_COUNT)]
+    content_hashes = ['%064x' % rng.randrange(ADDRESS_COUNT * 10) for _ in range(QUERY_COUNT)]
+
+    def current_balances():
+        for address in queries:
+            node.get_balance(address)
+
+    def historical_balances():
+        for address, height in zip(queries, heights):
+            node.get_balance(address, height)
+
+    def rage_indexes():
+        for content_hash in content_hashes:
+            node.get_rage_index(content_hash)
+
+    result['get_balance'] = dict(measure(current_balances, repeat), queries=QUERY_COUNT)
+    result['get_balance_at'] = dict(measure(historical_balances, repeat), queries=HISTORICAL_QUERY_COUNT)
+    result['get_rage_index'] = dict(measure(rage_indexes, repeat), queries=QUERY_COUNT)
+
+    def save_chain():
+        node.block_log.truncate(0)
+        node.checkpoint_height = 0
+        node._save_chain_to_disk()
+        node.block_log.sync()
+
+    result['save_chain'] = measure(save_chain, repeat)
+    result['disk_bytes'] = directory_size(coin.CHAIN_DATA_DIR)
+    node.block_log.close()
+
+    result['load_chain'] = measure(lambda: blockchain_cls(node_id).block_log.close(), repeat)
+    result['load_chain_full_verify'] = measure(
+        lambda: blockchain_cls(node_id, full_verify=True).block_log.close(), repeat)
+    result['open_reports_generated'] = len(reports)
+    shutil.rmtree(coin.CHAIN_DATA_DIR, ignore_errors=True)
+    return result
+
+
+def bench_proof_of_work(proofs, workers):
+    """Майнит блоки подряд начиная с last_proof=1 и сообщает скорость перебора."""
+    miners = [('tight', TightLoopMiner())]
+    if workers:
+        miners.append((f'process_{workers}', ProcessPoolMiner(workers)))
+    results = {}
+    for name, miner in miners:
+        last_proof = 1
+        hashes = 0
+        started = time.perf_counter()
+        for _ in range(proofs):
+            mined = miner.mine(last_proof)
+            hashes += mined.hashes
+            last_proof = mined.proof
+        elapsed = time.perf_counter() - started
+        miner.close()
+        results[name] = {'blocks': proofs, 'seconds': elapsed, 'hashes': hashes,
+                         'hashrate': hashes / elapsed if elapsed else 0.0}
+    return results
+
+
+def bench_api(coin, count):
+    client = coin.app.test_client()
+    bodies = [{'sender': 'addr_%04d' % (i % ADDRESS_COUNT), 'recipient': 'addr_%04d' % ((i * 7) % ADDRESS_COUNT),
+               'amount': i + 1, 'type': 'transfer'} for i in range(count)]
+    coin.blockchain.mempool.clear()
+    started = time.perf_counter()
+    for body in bodies:
+        client.post('/transactions/new', json=body)
+    single = time.perf_counter() - started
+
+    coin.blockchain.mempool.clear()
+    started = time.perf_counter()
+    batch_size = 500
+    for offset in range(0, count, batch_size):
+        client.post('/transactions/batch', json=bodies[offset:offset + batch_size])
+    batch = time.perf_counter() - started
+    coin.blockchain.mempool.clear()
+    return {
+        'transactions': count,
+        'transactions_new': {'seconds': single, 'tx_per_second': count / single},
+        'transactions_batch': {'seconds': batch, 'tx_per_second': count / batch, 'batch_size': batch_size}
+    }
+
+
+def git_revision(path):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, path=()):
+    """Построчное сравнение двух отчетов: лучшее время и отношение новое/старое."""
+    lines = []
+    for key in sorted(new):
+        if key not in old:
+            continue
+        if isinstance(new[key], dict) and 'best' in new[key] and isinstance(old[key], dict):
+            ratio = new[key]['best'] / old[key]['best'] if old[key]['best'] else float('inf')
+            lines.append(f"{'.'.join(path + (key,)):60} {old[key]['best']:10.4f}s -> "
+                         f"{new[key]['best']:10.4f}s  x{ratio:.2f}")
+        elif isinstance(new[key], dict) and isinstance(old[key], dict):
+            lines.extend(compare(old[key], new[key], path + (key,)))
+    return lines
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарки узла ChatRage')
+    parser.add_argument('--sizes', default='10k,100k,1m',
+                        help=f"размеры цепочек через запятую: {', '.join(SIZES)} или число транзакций")
+    parser.add_argument('--repeat', default=3, type=int, help='число повторов каждого замера')
+    parser.add_argument('--pow-blocks', default=10, type=int, help='сколько блоков майнить в замере proof_of_work')
+    parser.add_argument('--mining-workers', default=0, type=int,
+                        help='замерить также многопроцессный майнер и генерировать им proof цепочек')
+    parser.add_argument('--api-transactions', default=API_TRANSACTIONS, type=int,
+                        help='число транзакций для замера /transactions/new')
+    parser.add_argument('--output', help='файл для JSON-отчета (по умолчанию только stdout)')
+    parser.add_argument('--compare', help='JSON-отчет предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # Узел пишет данные в CHAIN_DATA_DIR относительно текущего каталога
+    work_dir = tempfile.mkdtemp(prefix='chatrage_bench_')
+    os.chdir(work_dir)
+    os.environ.setdefault('CHATRAGE_NODE_ID', 'bench_api')
+    try:
+        coin = importlib.import_module('chatrage_coin')
+        report = {
+            'meta': {
+                'revision': git_revision(repo_dir),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'txs_per_block': TXS_PER_BLOCK,
+                'repeat': args.repeat
+            },
+            'proof_of_work': bench_proof_of_work(args.pow_blocks, args.mining_workers),
+            'api': bench_api(coin, args.api_transactions),
+            'chains': {}
+        }
+        proof_sequence = ProofSequence(create_miner(args.mining_workers))
+        for label in args.sizes.split(','):
+            label = label.strip().lower()
+            tx_count = SIZES[label] if label in SIZES else int(label)
+            print(f"Цепочка {label}: {tx_count} транзакций...", file=sys.stderr)
+            report['chains'][label] = bench_chain(coin, label, tx_count, proof_sequence, args.repeat)
+        proof_sequence.miner.close()
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    if baseline is not None:
+        print('\n'.join(compare(baseline, report)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
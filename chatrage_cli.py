@@ -4,6 +4,8 @@ import json
 import hashlib
 import time
 
+from chatrage_merkle import verify_merkle_proof
+
 # Адрес узла, с которым будет взаимодействовать CLI
 NODE_URL = "http://127.0.0.1:5000"
 # Уникальный ID для нашего CLI-кошелька
@@ -30,32 +32,51 @@ def send_transaction(sender, recipient, amount, tx_type, data=None):
             print(f"Ответ сервера: {e.response.json().get('message', e.response.text)}")
 
 
+def wait_for_mining_job(job_id, poll_interval=0.5):
+    """Опрашивает статус фонового задания майнинга до его завершения."""
+    while True:
+        response = requests.get(f"{NODE_URL}/mine/{job_id}")
+        response.raise_for_status()
+        job = response.json()
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(poll_interval)
+
+
 def mine_block():
     """Запрашивает майнинг нового блока у узла."""
     try:
         response = requests.get(f"{NODE_URL}/mine")
         response.raise_for_status()
         print(f"Майнинг... {response.json().get('message')}")
-        print(f"Новый блок {response.json().get('index')} создан.")
+        job = wait_for_mining_job(response.json()['job_id'])
+        if job['status'] == 'done':
+            print(f"Новый блок {job.get('index')} создан.")
+        else:
+            print(f"Майнинг не завершен: {job.get('message') or job.get('error')}")
     except requests.exceptions.RequestException as e:
         print(f"Ошибка при майнинге: {e}")
         if e.response:
             print(f"Ответ сервера: {e.response.json().get('message', e.response.text)}")
 
 
-def get_chain():
-    """Получает всю цепочку блоков."""
+def get_chain(from_index=1):
+    """Получает цепочку блоков потоком, начиная с блока from_index."""
     try:
-        response = requests.get(f"{NODE_URL}/chain")
-        response.raise_for_status()
-        chain_info = response.json()
+        tip = requests.get(f"{NODE_URL}/chain/tip")
+        tip.raise_for_status()
         print("\n--- ТЕКУЩАЯ ЦЕПОЧКА BLOCKCHAIN ---")
-        print(f"Длина цепочки: {chain_info['length']}")
-        for block in chain_info['chain']:
-            print(f"Блок {block['index']}:")
-            print(
-                f"  Хеш: {block['previous_hash'][:10]}... -> {hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()[:10]}...")
-            print(f"  Транзакции: {json.dumps(block['transactions'], indent=2)}")
+        print(f"Длина цепочки: {tip.json()['length']}")
+        with requests.get(f"{NODE_URL}/chain/stream", params={'from': from_index}, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                block = json.loads(line)
+                print(f"Блок {block['index']}:")
+                print(
+                    f"  Хеш: {block['previous_hash'][:10]}... -> {hashlib.sha256(json.dumps(block, sort_keys=True).encode()).hexdigest()[:10]}...")
+                print(f"  Транзакции: {json.dumps(block['transactions'], indent=2)}")
         print("---------------------------------")
     except requests.exceptions.RequestException as e:
         print(f"Ошибка при получении цепочки: {e}")
@@ -182,6 +203,29 @@ def vote_on_report_cli():
     })
 
 
+def verify_report_cli():
+    """Проверяет, что Rage Report записан в цепочку, по доказательству Меркла от узла."""
+    report_id = input("Введите ID отчета для проверки: ")
+    try:
+        response = requests.get(f"{NODE_URL}/proof/{report_id}")
+        if response.status_code != 200:
+            print(f"Доказательство не получено: {response.text}")
+            return
+        proof = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Ошибка при получении доказательства: {e}")
+        return
+    # Проверяем сами: транзакция отчета должна сводиться к merkle_root блока
+    transaction = proof['transaction']
+    if transaction['type'] != 'rage_report' or transaction['data']['report_id'] != report_id:
+        print("Узел вернул транзакцию другого отчета!")
+    elif verify_merkle_proof(transaction, proof['proof'], proof['merkle_root']):
+        print(f"Отчет {report_id} включен в блок {proof['block_index']} "
+              f"(путь из {len(proof['proof'])} хешей, корень {proof['merkle_root'][:20]}...).")
+    else:
+        print("Доказательство не сходится с merkle_root блока!")
+
+
 def main_menu():
     print(f"\n--- ChatRageCoin CLI (Кошелек: {CLI_WALLET_ADDRESS}) ---")
     print(f"Подключен к узлу: {NODE_URL}")
@@ -195,6 +239,7 @@ def main_menu():
     print("8. Показать всю цепочку")
     print("9. Показать отчеты RAGE, ожидающие голосования")
     print("10. Проголосовать за Rage Report")
+    print("11. Проверить включение Rage Report в цепочку")
     print("0. Выход")
 
 
@@ -224,6 +269,8 @@ def run_cli():
             get_pending_reports_cli()
         elif choice == '10':
             vote_on_report_cli()
+        elif choice == '11':
+            verify_report_cli()
         elif choice == '0':
             print("Выход из ChatRageCoin CLI. Удачи!")
             break
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: без него журнал и /chain работают в JSON
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Первый байт записи журнала. Записи в JSON (в том числе старые, без байта формата)
+# всегда начинаются с '{', поэтому формат однозначно определяется по первому байту
+FORMAT_MSGPACK = 0x01
+JSON_RECORD_START = ord('{')
+DIGEST_SIZE = hashlib.sha256().digest_size
+DEFAULT_CODEC = os.environ.get('CHATRAGE_BLOCK_CODEC') or ('msgpack' if msgpack is not None else 'json')
+
+# Поля с адресами: одни и те же адреса повторяются в тысячах транзакций
+_ADDRESS_FIELDS = ('sender', 'recipient')
+_ADDRESS_DATA_FIELDS = ('reporter_address', 'voter_address')
+
+
+def msgpack_available():
+    return msgpack is not None
+
+
+def _intern_fields(mapping, fields):
+    for field in fields:
+        value = mapping.get(field)
+        if type(value) is str:
+            mapping[field] = sys.intern(value)
+
+
+def intern_transaction(tx):
+    """Заменяет строки адресов в транзакции единственными (интернированными) экземплярами."""
+    _intern_fields(tx, _ADDRESS_FIELDS)
+    data = tx.get('data')
+    if type(data) is dict:
+        _intern_fields(data, _ADDRESS_DATA_FIELDS)
+    return tx
+
+
+def intern_block(block):
+    for tx in block.get('transactions', ()):
+        if type(tx) is dict:
+            intern_transaction(tx)
+    return block
+
+
+def encode_record(block, codec=DEFAULT_CODEC, payload=None, block_hash=None):
+    """Запись журнала для блока.
+
+    JSON-запись - каноническая сериализация блока (по ней же считается хеш).
+    msgpack-запись - байт формата, sha256 блока и блок в msgpack: хеш блока
+    по-прежнему считается от канонического JSON, поэтому он хранится рядом.
+    """
+    if codec == 'msgpack':
+        try:
+            packed = msgpack.packb(block, use_bin_type=True)
+        except OverflowError:
+            # Целое вне 64 бит (например, из блока соседа со старой проверкой транзакций): такой блок пишем в JSON
+            packed = None
+        if packed is not None:
+            if block_hash is None:
+                block_hash = hashlib.sha256(payload or canonical_json(block)).hexdigest()
+            return bytes((FORMAT_MSGPACK,)) + bytes.fromhex(block_hash) + packed
+    return payload if payload is not None else canonical_json(block)
+
+
+def decode_record(record):
+    """Возвращает (блок, хеш блока) из записи журнала любого поддерживаемого формата."""
+    if not record:
+        raise ValueError("Пустая запись журнала")
+    if record[0] == JSON_RECORD_START:
+        return json.loads(record), hashlib.sha256(record).hexdigest()
+    if record[0] == FORMAT_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("Журнал содержит записи msgpack, а модуль msgpack не установлен")
+        block_hash = record[1:1 + DIGEST_SIZE].hex()
+        return msgpack.unpackb(record[1 + DIGEST_SIZE:], raw=False), block_hash
+    raise ValueError(f"Неизвестный формат записи журнала: {record[0]:#x}")
+
+
+def canonical_json(block):
+    return json.dumps(block, sort_keys=True).encode()
+
+
+def dumps_msgpack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def loads_msgpack(data):
+    return msgpack.unpackb(data, raw=False)
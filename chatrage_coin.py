@@ -1,83 +1,354 @@
 import hashlib
+import itertools
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 from urllib.parse import urlparse
 import os
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import requests
 
+from chatrage_codec import MSGPACK_MIMETYPE, dumps_msgpack, intern_block, msgpack_available
+from chatrage_compression import (COMPRESSIBLE_MIMETYPES, MIN_COMPRESS_SIZE, CompressedPageCache, compress,
+                                  negotiate_encoding)
+from chatrage_gossip import Gossip
+from chatrage_index import BalanceLedger, RageIndex, TransactionIndex
+from chatrage_locks import ReadWriteLock
+from chatrage_logging import DEFAULT_LEVEL, get_logger, setup_logging
+from chatrage_mempool import Mempool, is_amount, transaction_id, validate_transaction
+from chatrage_merkle import merkle_proof, merkle_root
+from chatrage_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from chatrage_mining import MiningJobManager, TightLoopMiner, create_miner
+from chatrage_server import DEFAULT_WORKERS, serve
+from chatrage_storage import BlockLog, read_checkpoint, read_json, write_checkpoint, write_json_atomic
+import chatrage_sync
+
 CHAIN_DATA_DIR = "blockchain_data"
+MAX_RAGE_INDEX_BATCH = 10000
+MAX_CHAIN_PAGE = 1000
+MAX_TRANSACTION_BATCH = 10000
+# Чекпоинт состояния пишется раз в CHECKPOINT_INTERVAL блоков; при заданном ключе он подписывается HMAC
+CHECKPOINT_INTERVAL = 1000
+CHECKPOINT_KEY = os.environ.get('CHATRAGE_CHECKPOINT_KEY')
+# Пороги голосования по rage-репортам и награда репортеру за подтвержденный репорт
+RAGE_APPROVE_QUORUM = 2
+RAGE_REJECT_QUORUM = 2
+RAGE_REPORT_REWARD = 15
 
 
 class ChatRageBlockchain:
-    def __init__(self, node_id):
+    def __init__(self, node_id, miner=None, full_verify=False, approve_quorum=RAGE_APPROVE_QUORUM,
+                 reject_quorum=RAGE_REJECT_QUORUM, report_reward=RAGE_REPORT_REWARD):
         self.node_id = node_id
+        self.approve_quorum = approve_quorum
+        self.reject_quorum = reject_quorum
+        self.report_reward = report_reward
+        self.miner = miner or TightLoopMiner()
+        self.last_mining_result = None
+        # Изменения цепочки, состояния и пула выполняются под lock.write(), чтение - под lock.read()
+        self.lock = ReadWriteLock()
+        self.state_log = get_logger('state', node_id)
+        self.sync_log = get_logger('sync', node_id)
+        self.mining_log = get_logger('mining', node_id)
         self.chain = []
-        self.pending_transactions = []
-        self.nodes = set()
+        # Хеши блоков считаются один раз при создании или получении блока
+        self.block_hashes = []
+        self.mempool = Mempool()
+        self.peers = chatrage_sync.PeerTable()
+        self.peer_client = chatrage_sync.PeerClient(peers=self.peers)
         self.staked_balances = {}
         self.pending_rage_reports = {}
+        self.balance_ledger = BalanceLedger()
+        self.rage_index = RageIndex()
+        self.tx_index = TransactionIndex()
+        # Устаревший формат: вся цепочка одним JSON-файлом (читается только для миграции)
         self.data_file_path = os.path.join(CHAIN_DATA_DIR, f"chain_{node_id}.json")
+        self.state_file_path = os.path.join(CHAIN_DATA_DIR, f"state_{node_id}.json")
+        self.block_log = BlockLog(os.path.join(CHAIN_DATA_DIR, f"blocks_{node_id}"))
+        self.checkpoint_file_path = os.path.join(CHAIN_DATA_DIR, f"checkpoint_{node_id}.json")
+        self.checkpoint_height = 0
+        # Один поток: чекпоинты записываются по порядку
+        self._checkpoint_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._checkpoint_future = None
+        self.metrics = MetricsRegistry()
+        self._register_metrics()
 
         if self._load_chain_from_disk():
-            print(f"[{self.node_id}] Блокчейн успешно загружен с диска. Длина цепи: {len(self.chain)}")
-            self._recalculate_states_from_chain()
-            print(f"[{self.node_id}] Состояния (балансы, отчеты) пересчитаны.")
+            self.state_log.info("Блокчейн успешно загружен с диска. Длина цепи: %d", len(self.chain))
+            if full_verify:
+                self.verify_full()
+            self.state_log.info("Состояния (балансы, отчеты) пересчитаны.")
         else:
-            print(f"[{self.node_id}] Новый блокчейн инициализирован. Создание генезис-блока.")
+            self.state_log.info("Новый блокчейн инициализирован. Создание генезис-блока.")
             self.create_block(proof=1, previous_hash='1')
 
-    def _save_chain_to_disk(self):
-        os.makedirs(CHAIN_DATA_DIR, exist_ok=True)
-        data_to_save = {
-            'chain': self.chain,
-            'pending_transactions': self.pending_transactions,
-            'staked_balances': self.staked_balances,
-            'pending_rage_reports': self.pending_rage_reports
-        }
-        with open(self.data_file_path, 'w') as f:
-            json.dump(data_to_save, f, indent=4)
-        print(f"[{self.node_id}] Блокчейн сохранен в {self.data_file_path}")
+    def _register_metrics(self):
+        # Размеры цепочки и пула вычисляются при отдаче /metrics, горячие пути их не обновляют
+        self.metrics.gauge('chatrage_block_height', 'Число блоков в цепочке').set_function(
+            lambda: len(self.chain))
+        self.metrics.gauge('chatrage_mining_hashrate', 'Скорость последнего майнинга, хешей в секунду').set_function(
+            lambda: self.last_mining_result.hashrate if self.last_mining_result else 0.0)
+        self.metrics.gauge('chatrage_mempool_transactions', 'Число ожидающих транзакций').set_function(
+            lambda: len(self.mempool))
+        self.metrics.gauge('chatrage_mempool_bytes', 'Размер ожидающих транзакций в байтах').set_function(
+            lambda: self.mempool.total_bytes)
+        self.metrics.counter('chatrage_mempool_evicted_total', 'Транзакции, вытесненные из переполненного пула').set_function(
+            lambda: self.mempool.evicted)
+        self.metrics.gauge('chatrage_peers', 'Число известных соседних узлов').set_function(
+            lambda: len(self.peers))
+        self.blocks_mined = self.metrics.counter('chatrage_blocks_mined_total', 'Блоки, добытые этим узлом')
+        self.save_duration = self.metrics.histogram(
+            'chatrage_save_duration_seconds', 'Время сохранения цепочки и состояния на диск')
+        self.resolve_peer_duration = self.metrics.histogram(
+            'chatrage_resolve_peer_duration_seconds', 'Время синхронизации с одним соседом в resolve_conflicts',
+            labelnames=('peer',))
+
+    def _save_chain_to_disk(self, replaced_from=None, payloads=None):
+        started = time.perf_counter()
+        # Журнал блоков только дописывается; при замене цепочки обрезаем его до точки расхождения
+        if replaced_from is not None:
+            self.block_log.truncate(replaced_from)
+        payloads = payloads or {}
+        for position in range(len(self.block_log), len(self.chain)):
+            self.block_log.append(self.chain[position], payloads.get(position), self.block_hashes[position])
+        if replaced_from is not None and replaced_from < self.checkpoint_height:
+            # Блок чекпоинта заменен: следующий чекпоинт пишем сразу
+            self.checkpoint_height = 0
+        if len(self.chain) - self.checkpoint_height >= CHECKPOINT_INTERVAL:
+            self._write_state_checkpoint()
+        # Рядом с журналом хранится только пул ожидающих транзакций: остальное состояние
+        # восстанавливается из чекпоинта и блоков после него
+        write_json_atomic(self.state_file_path, {
+            'height': len(self.chain),
+            'pending_transactions': self.pending_transactions
+        })
+        self.save_duration.observe(time.perf_counter() - started)
+        self.state_log.debug("Блокчейн сохранен в %s (блоков: %d)", self.block_log.directory, len(self.block_log))
 
     def _load_chain_from_disk(self):
-        if os.path.exists(self.data_file_path):
-            try:  # НОВОЕ: Обработка ошибок при загрузке
-                with open(self.data_file_path, 'r') as f:
-                    data_loaded = json.load(f)
-                    self.chain = data_loaded.get('chain', [])
-                    self.pending_transactions = data_loaded.get('pending_transactions', [])
-                    self.staked_balances = data_loaded.get('staked_balances', {})
-                    self.pending_rage_reports = data_loaded.get('pending_rage_reports', {})
-                # Простая проверка валидности загруженной цепочки
-                if not self.chain or not self.valid_chain(self.chain):
-                    print(f"[{self.node_id}] Загруженная цепочка невалидна или пуста. Инициализация новой.")
-                    self.chain = []
-                    return False
-                return True
-            except json.JSONDecodeError as e:
-                print(f"[{self.node_id}] Ошибка при декодировании JSON из {self.data_file_path}: {e}")
-                return False
-        return False
+        chain, hashes = self.block_log.read_all()
+        if not chain:
+            return self._migrate_legacy_chain_file()
+
+        state = read_json(self.state_file_path) or {}
+        self._load_pending_transactions(state.get('pending_transactions', []))
+        # Чекпоинт мог не успеть записаться после последних блоков: убираем уже попавшие в них транзакции
+        for block in chain[state.get('height', len(chain)):]:
+            self.mempool.remove(transaction_id(tx) for tx in block['transactions'])
+        # Блоки до чекпоинта проверены и применены при его создании: проверяем и переигрываем только хвост
+        checkpoint = self._read_state_checkpoint(hashes)
+        start = checkpoint['height'] if checkpoint else 0
+        # Хеш из msgpack-записи взят из самой записи: для непроверенного хвоста сверяем его с содержимым блока
+        tampered = next((position for position in range(start, len(chain))
+                         if self.hash(chain[position]) != hashes[position]), None)
+        if tampered is not None:
+            self.state_log.error("Блок %d в журнале не совпадает со своим хешем.", tampered + 1)
+        if tampered is not None or not self.valid_chain(chain[max(start - 1, 0):], hashes[max(start - 1, 0):]):
+            self.state_log.error("Загруженная цепочка невалидна. Инициализация новой.")
+            self.block_log.truncate(0)
+            return False
+        self.chain = chain
+        self.block_hashes = hashes
+        if checkpoint:
+            self._restore_state(checkpoint['state'], start)
+            self.checkpoint_height = start
+            self.state_log.info("Состояние восстановлено из чекпоинта на блоке %d.", start)
+        self._recalculate_states_from_chain(start)
+        return True
 
-    def create_block(self, proof, previous_hash=None):
-        block = {
-            'index': len(self.chain) + 1,
-            'timestamp': time.time(),
-            'transactions': self.pending_transactions,
-            'proof': proof,
-            'previous_hash': previous_hash or self.hash(self.chain[-1]),
+    def _export_state(self):
+        """Копия состояния для чекпоинта: ее можно сериализовать после снятия блокировки.
+
+        Копируются только изменяемые словари; значения в них (числа, данные
+        транзакций, положения [блок, номер]) после записи не меняются.
+        """
+        return {
+            'staked_balances': dict(self.staked_balances),
+            'pending_rage_reports': {
+                report_id: {'report_data': info['report_data'], 'votes': dict(info['votes']),
+                            'tally': dict(info['tally'])}
+                for report_id, info in self.pending_rage_reports.items()
+            },
+            'balances': dict(self.balance_ledger.balances),
+            'rage_counts': dict(self.rage_index.counts),
+            'rage_reasons': {content_hash: dict(by_reason)
+                             for content_hash, by_reason in self.rage_index.reasons.items()},
+            'tx_locations': dict(self.tx_index.transactions),
+            'report_locations': dict(self.tx_index.reports)
         }
-        self.pending_transactions = []
-        self.chain.append(block)
 
-        self._process_block_transactions(block['transactions'])
+    def _restore_state(self, state, height):
+        self.staked_balances = state['staked_balances']
+        self.pending_rage_reports = state['pending_rage_reports']
+        self._ensure_vote_tallies()
+        self.balance_ledger.restore(state['balances'], height)
+        self.rage_index.restore(state['rage_counts'], state['rage_reasons'])
+        if 'tx_locations' in state:
+            self.tx_index.restore(state['tx_locations'], state['report_locations'])
+        else:
+            # Чекпоинт записан до появления индекса транзакций: строим его по блокам до чекпоинта
+            self.tx_index.reset()
+            for block in itertools.islice(self.chain, height):
+                self.tx_index.apply_block(block)
+
+    def _write_state_checkpoint(self):
+        # Чекпоинт не должен ссылаться на блоки, которые еще не сброшены на диск
+        self.block_log.sync()
+        # Под блокировкой только снимаем копию состояния: сериализация и запись идут в отдельном
+        # потоке и не задерживают читателей. Если блок чекпоинта успеют заменить, при загрузке
+        # чекпоинт не совпадет с цепочкой по хешу и будет пропущен
+        height, block_hash, state = len(self.chain), self.last_block_hash, self._export_state()
+        self.checkpoint_height = height
+        self._checkpoint_future = self._checkpoint_writer.submit(self._store_checkpoint, height, block_hash, state)
+
+    def _store_checkpoint(self, height, block_hash, state):
+        try:
+            write_checkpoint(self.checkpoint_file_path, height, block_hash, state, CHECKPOINT_KEY)
+        except OSError:
+            self.state_log.exception("Не удалось записать чекпоинт состояния на блоке %d.", height)
+            return
+        self.state_log.info("Записан чекпоинт состояния на блоке %d.", height)
+
+    def flush_checkpoint(self):
+        """Дожидается записи последнего снятого чекпоинта."""
+        future = self._checkpoint_future
+        if future is not None:
+            future.result()
+
+    def _read_state_checkpoint(self, hashes):
+        checkpoint = read_checkpoint(self.checkpoint_file_path, CHECKPOINT_KEY)
+        if checkpoint is None:
+            return None
+        height = checkpoint['height']
+        # Чекпоинт годится, только если его блок есть в нашей цепочке
+        if not 1 <= height <= len(hashes) or hashes[height - 1] != checkpoint['block_hash']:
+            return None
+        return checkpoint
+
+    def verify_full(self):
+        """Полная проверка: хеши всех блоков пересчитываются, цепочка валидируется
+        с генезиса, а состояние переигрывается по всем транзакциям."""
+        with self.lock.write():
+            hashes = [self.hash(block) for block in self.chain]
+            if not self.valid_chain(self.chain, hashes):
+                self.state_log.error("Полная проверка: цепочка невалидна. Инициализация новой.")
+                self.chain = []
+                self.block_hashes = []
+                self.block_log.truncate(0)
+                self.checkpoint_height = 0
+                self._recalculate_states_from_chain()
+                self.create_block(proof=1, previous_hash='1')
+                return False
+            self.block_hashes = hashes
+            self._recalculate_states_from_chain()
+            return True
+
+    def _migrate_legacy_chain_file(self):
+        if not os.path.exists(self.data_file_path):
+            return False
+        try:
+            with open(self.data_file_path, 'r') as f:
+                data_loaded = json.load(f)
+        except json.JSONDecodeError as e:
+            self.state_log.error("Ошибка при декодировании JSON из %s: %s", self.data_file_path, e)
+            return False
+        chain = data_loaded.get('chain', [])
+        self._load_pending_transactions(data_loaded.get('pending_transactions', []))
+        self.staked_balances = data_loaded.get('staked_balances', {})
+        self.pending_rage_reports = data_loaded.get('pending_rage_reports', {})
+        hashes = [self.hash(block) for block in chain]
+        if not chain or not self.valid_chain(chain, hashes):
+            self.state_log.error("Загруженная цепочка невалидна или пуста. Инициализация новой.")
+            return False
+        self.chain = chain
+        self.block_hashes = hashes
+        self._recalculate_states_from_chain()
         self._save_chain_to_disk()
+        self.block_log.sync()
+        os.replace(self.data_file_path, f"{self.data_file_path}.migrated")
+        self.state_log.warning("Цепочка из %s перенесена в журнал блоков.", self.data_file_path)
+        return True
+
+    @property
+    def pending_transactions(self):
+        return list(self.mempool)
+
+    def _load_pending_transactions(self, transactions):
+        self.mempool.clear()
+        for tx in transactions:
+            self.mempool.add(tx, priority=tx['sender'] == "Rage_Protocol_Reward")
+
+    def create_block(self, proof, previous_hash=None, transactions=None):
+        with self.lock.write():
+            if transactions is None:
+                template = self.mempool.build_template()
+                self.mempool.remove(tx_id for tx_id, _ in template)
+                transactions = [tx for _, tx in template]
+            block = {
+                'index': len(self.chain) + 1,
+                'timestamp': time.time(),
+                'transactions': transactions,
+                'merkle_root': merkle_root(transactions),
+                'proof': proof,
+                'previous_hash': previous_hash or self.last_block_hash,
+            }
+            # Каноническое представление блока используется и для хеша, и для записи в журнал
+            payload = self.canonical_bytes(block)
+            self.chain.append(block)
+            self.block_hashes.append(hashlib.sha256(payload).hexdigest())
+            try:
+                self._process_block_transactions(block)
+                self._save_chain_to_disk(payloads={len(self.chain) - 1: payload})
+            except Exception:
+                # Блок не применился или не записался: убираем его, пока он не виден читателям,
+                # из журнала тоже, а частично измененное состояние восстанавливаем по цепочке без него
+                self.chain.pop()
+                self.block_hashes.pop()
+                self.block_log.truncate(len(self.chain))
+                if self.checkpoint_height > len(self.chain):
+                    self.checkpoint_height = 0
+                self._recalculate_states_from_chain()
+                self.state_log.exception("Блок %d отклонен: ошибка при применении или записи.", block['index'])
+                raise
 
         return block
 
-    def new_transaction(self, sender, recipient, amount, tx_type, data=None):
+    def mine_block(self, reward_address):
+        # Шаблон блока фиксируется до начала майнинга; транзакции, пришедшие позже, попадут в следующий блок
+        with self.lock.read():
+            last_block = self.last_block
+            last_block_hash = self.last_block_hash
+            template = self.mempool.build_template()
+
+        proof = self.proof_of_work(last_block['proof'], should_stop=lambda: self.last_block is not last_block)
+        if proof is None:
+            self.mining_log.info("Майнинг блока %d отменен: вершина цепочки сменилась.", last_block['index'] + 1)
+            return None, self.last_mining_result
+
+        with self.lock.write():
+            if self.last_block is not last_block:
+                self.mining_log.info("Найденный proof устарел: вершина цепочки сменилась.")
+                return None, self.last_mining_result
+            self.mempool.remove(tx_id for tx_id, _ in template)
+            transactions = [tx for _, tx in template]
+            # Номер блока в data отличает награды одному адресу за разные блоки друг от друга
+            transactions.append({
+                'sender': "0",
+                'recipient': reward_address,
+                'amount': 1,
+                'type': 'transfer',
+                'data': {'block_index': last_block['index'] + 1}
+            })
+            block = self.create_block(proof, last_block_hash, transactions=transactions)
+        result = self.last_mining_result
+        self.blocks_mined.inc()
+        self.mining_log.info("Добыт блок %d: транзакций %d, %.0f хешей/с.",
+                             block['index'], len(transactions), result.hashrate)
+        return block, result
+
+    def new_transaction(self, sender, recipient, amount, tx_type, data=None, priority=False):
         transaction = {
             'sender': sender,
             'recipient': recipient,
@@ -85,25 +356,36 @@ class ChatRageBlockchain:
             'type': tx_type,
             'data': data
         }
-        self.pending_transactions.append(transaction)
-        # НОВОЕ: Более информативный вывод для транзакций
-        print(f"[{self.node_id}] Новая транзакция типа '{tx_type}' от '{sender}' добавлена в ожидающие.")
+        with self.lock.write():
+            tx_id, added = self.mempool.add(transaction, priority)
+        if added:
+            self.state_log.debug("Новая транзакция типа '%s' от '%s' добавлена в ожидающие.", tx_type, sender)
+        else:
+            self.state_log.debug("Транзакция %s уже есть в ожидающих.", tx_id)
         return self.last_block['index'] + 1
 
+    @staticmethod
+    def canonical_bytes(block):
+        return json.dumps(block, sort_keys=True).encode()
+
     @staticmethod
     def hash(block):
-        block_string = json.dumps(block, sort_keys=True).encode()
+        block_string = ChatRageBlockchain.canonical_bytes(block)
         return hashlib.sha256(block_string).hexdigest()
 
     @property
     def last_block(self):
         return self.chain[-1]
 
-    def proof_of_work(self, last_proof):
-        proof = 0
-        while self.valid_proof(last_proof, proof) is False:
-            proof += 1
-        return proof
+    @property
+    def last_block_hash(self):
+        return self.block_hashes[-1]
+
+    def proof_of_work(self, last_proof, should_stop=None):
+        # Возвращает None, если майнинг был отменен через should_stop
+        result = self.miner.mine(last_proof, should_stop)
+        self.last_mining_result = result
+        return result.proof
 
     @staticmethod
     def valid_proof(last_proof, proof):
@@ -113,69 +395,228 @@ class ChatRageBlockchain:
 
     def register_node(self, address):
         parsed_url = urlparse(address)
-        if parsed_url.netloc:
-            self.nodes.add(parsed_url.netloc)
-            print(f"[{self.node_id}] Зарегистрирован новый узел: {parsed_url.netloc}")
-        elif parsed_url.path:
-            self.nodes.add(parsed_url.path)
-            print(f"[{self.node_id}] Зарегистрирован новый узел: {parsed_url.path}")
-        else:
+        node = parsed_url.netloc or parsed_url.path
+        if not node:
             raise ValueError("Неверный URL узла")
+        self.peers.add(node)
+        self.sync_log.info("Зарегистрирован новый узел: %s", node)
 
-    def valid_chain(self, chain):
-        last_block = chain[0]
-        current_index = 1
+    @property
+    def nodes(self):
+        return set(self.peers)
+
+    def get_nodes(self):
+        """Соседи, которых можно опрашивать сейчас, в порядке предпочтения (см. PeerTable.ranked)."""
+        return self.peers.ranked()
+
+    def _hash_blocks(self, chain):
+        # Для блоков, совпадающих с нашей цепочкой, хеш берется из кеша
+        hashes = []
+        for position, block in enumerate(chain):
+            if position >= len(self.chain) or not (block is self.chain[position] or block == self.chain[position]):
+                break
+            hashes.append(self.block_hashes[position])
+        hashes.extend(self.hash(block) for block in chain[len(hashes):])
+        return hashes
+
+    def valid_chain(self, chain, hashes=None):
+        known = 0
+        if hashes is None:
+            hashes = self._hash_blocks(chain)
+            # Префикс, совпадающий с нашей (уже проверенной) цепочкой, повторно не проверяем
+            while known < min(len(chain), len(self.chain)) and hashes[known] == self.block_hashes[known]:
+                known += 1
+        current_index = max(known, 1)
+        last_block = chain[current_index - 1]
         while current_index < len(chain):
             block = chain[current_index]
             # НОВОЕ: Проверяем наличие всех обязательных полей
             if not all(k in block for k in ['index', 'timestamp', 'transactions', 'proof', 'previous_hash']):
-                print(f"[{self.node_id}] DEBUG: Невалидный блок {block.get('index', 'N/A')}: отсутствуют поля.")
+                self.sync_log.debug("Невалидный блок %s: отсутствуют поля.", block.get('index', 'N/A'))
                 return False
-            if block['previous_hash'] != self.hash(last_block):
-                print(f"[{self.node_id}] DEBUG: Невалидный блок {block['index']}: неверный previous_hash.")
+            if block['previous_hash'] != hashes[current_index - 1]:
+                self.sync_log.debug("Невалидный блок %s: неверный previous_hash.", block['index'])
                 return False
             if not self.valid_proof(last_block['proof'], block['proof']):
-                print(f"[{self.node_id}] DEBUG: Невалидный блок {block['index']}: неверный proof.")
+                self.sync_log.debug("Невалидный блок %s: неверный proof.", block['index'])
+                return False
+            # Блоки, созданные до появления merkle_root, его не содержат
+            if 'merkle_root' in block and block['merkle_root'] != merkle_root(block['transactions']):
+                self.sync_log.debug("Невалидный блок %s: неверный merkle_root.", block['index'])
                 return False
             last_block = block
             current_index += 1
         return True
 
-    def resolve_conflicts(self):
-        neighbours = self.nodes
-        new_chain = None
-        max_length = len(self.chain)
-        print(f"[{self.node_id}] Запуск разрешения конфликтов. Текущие узлы: {self.nodes}")
+    def get_page(self, from_index, limit):
+        """Страница блоков и длина цепочки, снятые под одной блокировкой: (блоки, длина, хеш последнего блока страницы).
+
+        Хеш последнего блока страницы (None для пустой) вместе с ее началом однозначно
+        определяет содержимое страницы: новые блоки над ней его не меняют, а смена ветки меняет.
+        """
+        # Индексы блоков начинаются с 1
+        start = max(from_index, 1) - 1
+        with self.lock.read():
+            page = self.chain[start:start + limit]
+            page_hash = self.block_hashes[start + len(page) - 1] if page else None
+            return page, len(self.chain), page_hash
+
+    def get_chain(self, from_index=1):
+        """Снимок цепочки с блока from_index. Блоки после добавления не меняются,
+        поэтому копируется только список ссылок на них."""
+        with self.lock.read():
+            return self.chain[max(from_index, 1) - 1:]
+
+    def get_tip(self):
+        """Длина цепочки и хеш последнего блока, согласованные между собой."""
+        with self.lock.read():
+            return len(self.chain), self.last_block_hash
+
+    def find_fork_point(self, locator):
+        """Наибольший индекс из локатора, на котором наша цепочка совпадает с цепочкой соседа."""
+        with self.lock.read():
+            for index, block_hash in locator:
+                if 1 <= index <= len(self.chain) and self.block_hashes[index - 1] == block_hash:
+                    return index
+        return 0
+
+    def _valid_fork(self, fork_point, blocks):
+        """Проверяет только суффикс после общего предка. Возвращает хеши блоков суффикса или None."""
+        for offset, block in enumerate(blocks):
+            if block.get('index') != fork_point + offset + 1:
+                return None
+        hashes = [self.hash(block) for block in blocks]
+        if fork_point == 0:
+            valid = bool(blocks) and self.valid_chain(blocks, hashes)
+        else:
+            valid = self.valid_chain([self.chain[fork_point - 1]] + blocks,
+                                     [self.block_hashes[fork_point - 1]] + hashes)
+        return hashes if valid else None
+
+    def _fetch_fork(self, node, length, max_length, deadline_at):
+        """Загружает у соседа блоки после общего предка вплоть до блока length.
+
+        Возвращает (общий предок, его блок, блоки, их хеши), если цепочка соседа
+        валидна и длиннее max_length, иначе None.
+        """
+        with self.lock.read():
+            locator = chatrage_sync.block_locator(self.block_hashes)
+        fork_point = self.peer_client.locate_fork_point(node, locator, deadline_at)
+        blocks = self.peer_client.fetch_blocks(node, fork_point + 1, length, deadline_at)
+        self.sync_log.info("Общий предок с %s: блок %d, загружено блоков: %d.", node, fork_point, len(blocks))
+        with self.lock.read():
+            anchor = self.chain[fork_point - 1] if fork_point else None
+            hashes = self._valid_fork(fork_point, blocks) if fork_point + len(blocks) > max_length else None
+        return (fork_point, anchor, blocks, hashes) if hashes is not None else None
+
+    def _adopt_fork(self, fork_point, anchor, blocks, hashes):
+        """Заменяет блоки после общего предка загруженными. Возвращает True, если цепочка изменилась."""
+        with self.lock.write():
+            # Пока шла загрузка, наша цепочка могла вырасти или смениться
+            still_attached = fork_point == 0 or (fork_point <= len(self.chain)
+                                                 and self.chain[fork_point - 1] is anchor)
+            if not still_attached or fork_point + len(blocks) <= len(self.chain):
+                return False
+            for block in blocks:
+                intern_block(block)
+            if fork_point == len(self.chain):
+                # Блоки соседа продолжают нашу цепочку: применяем только их, без переигрывания
+                self.chain.extend(blocks)
+                self.block_hashes.extend(hashes)
+                for block in blocks:
+                    self._process_block_transactions(block, replay=True)
+                replaced_from = None
+            else:
+                # Блоки в начале суффикса могут совпадать с нашими: журнал обрезаем с первого отличия
+                replaced_from = fork_point
+                while (replaced_from < len(self.chain) and replaced_from - fork_point < len(blocks)
+                       and self.block_hashes[replaced_from] == hashes[replaced_from - fork_point]):
+                    replaced_from += 1
+                self.chain = self.chain[:fork_point] + blocks
+                self.block_hashes = self.block_hashes[:fork_point] + hashes
+                self._recalculate_states_from_chain()
+            # Транзакции, попавшие в принятые блоки, больше не ожидают включения
+            self.mempool.remove(transaction_id(tx) for block in blocks for tx in block['transactions'])
+            self._save_chain_to_disk(replaced_from=replaced_from)
+        if replaced_from is None:
+            self.sync_log.info("Цепочка продолжена блоками соседа: %d-%d.", fork_point + 1, fork_point + len(blocks))
+        else:
+            self.sync_log.warning("Цепочка была заменена более длинной и валидной (с блока %d).", replaced_from + 1)
+        return True
 
-        for node in neighbours:
+    def resolve_conflicts(self, deadline=chatrage_sync.RESOLVE_DEADLINE):
+        best = None
+        max_length = len(self.chain)
+        deadline_at = time.monotonic() + deadline
+        nodes = self.get_nodes()
+        self.sync_log.info("Запуск разрешения конфликтов. Текущие узлы: %s", nodes)
+
+        # Вершины запрашиваем у всех соседей параллельно
+        tips = self.peer_client.fetch_tips(nodes, deadline_at)
+        self.sync_log.info("Ответили узлов: %d из %d.", len(tips), len(nodes))
+        # Среди соседей с одинаково длинной цепочкой первыми идут самые быстрые
+        rank = {node: position for position, node in enumerate(nodes)}
+        candidates = sorted(tips.items(), key=lambda item: (-item[1]['length'], rank[item[0]]))
+
+        for node, tip in candidates:
+            if tip['length'] <= max_length or time.monotonic() >= deadline_at:
+                break
+            peer_started = time.perf_counter()
             try:
-                print(f"[{self.node_id}] Запрашиваем цепочку у узла: {node}")
-                response = requests.get(f'http://{node}/chain')
-                if response.status_code == 200:
-                    data = response.json()
-                    length = data['length']
-                    chain = data['chain']
-                    print(f"[{self.node_id}] Получена цепочка длиной {length} от {node}.")
-                    if length > max_length and self.valid_chain(chain):
-                        max_length = length
-                        new_chain = chain
-                        print(f"[{self.node_id}] Обнаружена более длинная и валидная цепочка от {node}.")
+                fork = self._fetch_fork(node, tip['length'], max_length, deadline_at)
+                if fork is not None:
+                    fork_point, _, blocks, _ = fork
+                    max_length = fork_point + len(blocks)
+                    best = fork
+                    self.sync_log.info("Обнаружена более длинная и валидная цепочка от %s.", node)
             except requests.exceptions.ConnectionError:
-                print(f"[{self.node_id}] Не удалось подключиться к узлу: {node}")
+                self.sync_log.warning("Не удалось подключиться к узлу: %s", node)
                 continue
             except Exception as e:  # НОВОЕ: Общая обработка ошибок сети
-                print(f"[{self.node_id}] Неизвестная ошибка при запросе к {node}: {e}")
+                self.sync_log.warning("Неизвестная ошибка при запросе к %s: %s", node, e)
+            finally:
+                self.resolve_peer_duration.observe(time.perf_counter() - peer_started, peer=node)
 
-        if new_chain:
-            self.chain = new_chain
-            self._recalculate_states_from_chain()
-            self._save_chain_to_disk()
-            print(f"[{self.node_id}] Цепочка была заменена более длинной и валидной.")
+        if best and self._adopt_fork(*best):
             return True
-        print(f"[{self.node_id}] Наша цепочка является самой длинной и валидной.")
+        self.sync_log.info("Наша цепочка является самой длинной и валидной.")
         return False
 
-    def submit_rage_report(self, reporter_address, content_to_hash, reason_code, stake_amount=0):
+    def sync_from_peer(self, node, length, deadline=chatrage_sync.RESOLVE_DEADLINE):
+        """Догоняет соседа, объявившего цепочку длины length. Возвращает True, если цепочка изменилась."""
+        if length <= self.get_tip()[0]:
+            return False
+        fork = self._fetch_fork(node, length, self.get_tip()[0], time.monotonic() + deadline)
+        return fork is not None and self._adopt_fork(*fork)
+
+    def knows_block(self, index, block_hash):
+        with self.lock.read():
+            return 1 <= index <= len(self.chain) and self.block_hashes[index - 1] == block_hash
+
+    def unknown_transactions(self, tx_ids):
+        """Id из tx_ids, которых нет ни в пуле, ни в цепочке."""
+        with self.lock.read():
+            return [tx_id for tx_id in tx_ids
+                    if tx_id not in self.mempool and self.tx_index.get_transaction(tx_id) is None]
+
+    def add_transactions(self, transactions):
+        """Добавляет транзакции в пул под одной блокировкой. Возвращает [(tx_id, добавлена ли)].
+
+        Транзакция, которая уже есть в пуле или в цепочке, не добавляется повторно.
+        """
+        with self.lock.write():
+            results = []
+            for tx in transactions:
+                tx_id = transaction_id(tx)
+                if self.tx_index.get_transaction(tx_id) is not None:
+                    results.append((tx_id, False))
+                else:
+                    results.append(self.mempool.add(tx))
+        added = sum(1 for _, is_new in results if is_new)
+        self.state_log.debug("В ожидающие добавлено транзакций: %d из %d.", added, len(transactions))
+        return results
+
+    def rage_report_transactions(self, reporter_address, content_to_hash, reason_code, stake_amount=0):
         content_hash = hashlib.sha256(content_to_hash.encode()).hexdigest()
 
         report_data = {
@@ -187,19 +628,31 @@ class ChatRageBlockchain:
             'stake_amount': stake_amount
         }
 
+        transactions = []
         if stake_amount > 0:
-            self.new_transaction(reporter_address, "RAGE_Staking_Pool", stake_amount, 'stake',
-                                 data={'report_id': report_data['report_id']})
-
-        return self.new_transaction(
-            sender=reporter_address,
-            recipient="Rage_Protocol",
-            amount=0,
-            tx_type='rage_report',
-            data=report_data
-        )
+            transactions.append({
+                'sender': reporter_address,
+                'recipient': "RAGE_Staking_Pool",
+                'amount': stake_amount,
+                'type': 'stake',
+                'data': {'report_id': report_data['report_id']}
+            })
+        transactions.append({
+            'sender': reporter_address,
+            'recipient': "Rage_Protocol",
+            'amount': 0,
+            'type': 'rage_report',
+            'data': report_data
+        })
+        return transactions
 
-    def vote_on_rage_report(self, voter_address, report_id, vote_type):
+    def submit_rage_report(self, reporter_address, content_to_hash, reason_code, stake_amount=0):
+        self.add_transactions(self.rage_report_transactions(reporter_address, content_to_hash,
+                                                            reason_code, stake_amount))
+        return self.last_block['index'] + 1
+
+    @staticmethod
+    def vote_transaction(voter_address, report_id, vote_type):
         if vote_type not in ['approve', 'reject']:
             raise ValueError("Тип голоса должен быть 'approve' или 'reject'.")
 
@@ -209,191 +662,377 @@ class ChatRageBlockchain:
             'vote_type': vote_type,
             'timestamp': time.time()
         }
-        return self.new_transaction(
-            sender=voter_address,
-            recipient="Rage_DAO",
-            amount=0,
-            tx_type='vote_rage_report',
-            data=vote_data
-        )
+        return {
+            'sender': voter_address,
+            'recipient': "Rage_DAO",
+            'amount': 0,
+            'type': 'vote_rage_report',
+            'data': vote_data
+        }
 
-    def get_rage_index(self, content_hash):
-        rage_count = 0
-        for block in self.chain:
-            for tx in block['transactions']:
-                if tx['type'] == 'rage_report' and tx['data']['content_hash'] == content_hash:
-                    rage_count += 1
-        return rage_count
-
-    def _process_block_transactions(self, transactions):
-        for tx in transactions:
-            if tx['type'] == 'stake':
-                sender = tx['sender']
-                amount = tx['amount']
-                self.staked_balances[sender] = self.staked_balances.get(sender, 0) + amount
-                print(
-                    f"[{self.node_id}] INFO: {sender} застейкал {amount} RAGE. Всего застейкано: {self.staked_balances[sender]}")  # DEBUG -> INFO
-            elif tx['type'] == 'unstake':
-                sender = tx['sender']
-                amount = tx['amount']
-                if self.staked_balances.get(sender, 0) >= amount:
-                    self.staked_balances[sender] -= amount
-                    print(
-                        f"[{self.node_id}] INFO: {sender} анстейкал {amount} RAGE. Осталось застейкано: {self.staked_balances[sender]}")  # DEBUG -> INFO
-                else:
-                    print(
-                        f"[{self.node_id}] WARN: {sender} пытается анстейкнуть больше, чем застейкано. Доступно: {self.staked_balances.get(sender, 0)}, Запрос: {amount}")  # DEBUG -> WARN
-            elif tx['type'] == 'rage_report':
-                report_id = tx['data']['report_id']
-                self.pending_rage_reports[report_id] = {
-                    'report_data': tx['data'],
-                    'votes': {}
-                }
-                print(
-                    f"[{self.node_id}] INFO: Rage Report {report_id} добавлен в ожидающие голосования.")  # DEBUG -> INFO
-
-            elif tx['type'] == 'vote_rage_report':
-                report_id = tx['data']['report_id']
-                voter_address = tx['data']['voter_address']
-                vote_type = tx['data']['vote_type']
-
-                if report_id in self.pending_rage_reports:
-                    if voter_address not in self.pending_rage_reports[report_id]['votes']:
-                        self.pending_rage_reports[report_id]['votes'][voter_address] = vote_type
-                        print(
-                            f"[{self.node_id}] INFO: {voter_address} проголосовал '{vote_type}' за репорт {report_id}.")  # DEBUG -> INFO
-                        self._check_and_reward_rage_report(report_id)
-                    else:
-                        print(
-                            f"[{self.node_id}] WARN: {voter_address} уже голосовал за репорт {report_id}.")  # DEBUG -> WARN
-                else:
-                    print(
-                        f"[{self.node_id}] WARN: Получено голосование за несуществующий или уже обработанный репорт {report_id}.")  # DEBUG -> WARN
+    def vote_on_rage_report(self, voter_address, report_id, vote_type):
+        if not self.rage_report_exists(report_id):
+            raise ValueError(f"Rage Report {report_id} не найден.")
+        self.add_transactions([self.vote_transaction(voter_address, report_id, vote_type)])
+        return self.last_block['index'] + 1
 
-            elif tx['type'] == 'transfer':
-                print(
-                    f"[{self.node_id}] INFO: Транзакция перевода: {tx['sender']} -> {tx['recipient']} Amount: {tx['amount']}")  # DEBUG -> INFO
+    def get_rage_index(self, content_hash):
+        with self.lock.read():
+            return self.rage_index.get(content_hash)
+
+    def get_rage_indexes(self, content_hashes):
+        with self.lock.read():
+            return [{
+                'content_hash': content_hash,
+                'rage_index': self.rage_index.get(content_hash),
+                'reasons': self.rage_index.get_reasons(content_hash)
+            } for content_hash in content_hashes]
+
+    def _process_block_transactions(self, block, replay=False):
+        """Применяет транзакции блока к состоянию узла.
+
+        Используется и для новых блоков, и для переигрывания цепочки. При
+        replay=True работает тихо и не выдает награды: они уже записаны в цепочке.
+        """
+        self.balance_ledger.apply_block(block)
+        self.rage_index.apply_block(block)
+        self.tx_index.apply_block(block)
+        handlers = self._TX_HANDLERS
+        for tx in block['transactions']:
+            handler = handlers.get(tx['type'])
+            if handler is not None:
+                handler(self, tx, replay)
+
+    def _apply_stake(self, tx, replay):
+        sender = tx['sender']
+        amount = tx['amount']
+        self.staked_balances[sender] = self.staked_balances.get(sender, 0) + amount
+        if not replay:
+            self.state_log.debug("%s застейкал %s RAGE. Всего застейкано: %s", sender, amount, self.staked_balances[sender])
+
+    def _apply_unstake(self, tx, replay):
+        sender = tx['sender']
+        amount = tx['amount']
+        if self.staked_balances.get(sender, 0) >= amount:
+            self.staked_balances[sender] -= amount
+            if not replay:
+                self.state_log.debug("%s анстейкал %s RAGE. Осталось застейкано: %s",
+                                     sender, amount, self.staked_balances[sender])
+        elif not replay:
+            self.state_log.info("%s пытается анстейкнуть больше, чем застейкано. Доступно: %s, Запрос: %s",
+                                sender, self.staked_balances.get(sender, 0), amount)
+
+    def _apply_rage_report(self, tx, replay):
+        report_id = tx['data']['report_id']
+        self.pending_rage_reports[report_id] = {
+            'report_data': tx['data'],
+            'votes': {},
+            'tally': {'approve': 0, 'reject': 0}
+        }
+        if not replay:
+            self.state_log.debug("Rage Report %s добавлен в ожидающие голосования.", report_id)
+
+    def _apply_vote(self, tx, replay):
+        report_id = tx['data']['report_id']
+        voter_address = tx['data']['voter_address']
+        vote_type = tx['data']['vote_type']
+
+        report_info = self.pending_rage_reports.get(report_id)
+        if report_info is None:
+            if not replay:
+                self.state_log.info("Получено голосование за несуществующий или уже обработанный репорт %s.", report_id)
+            return
+        if voter_address in report_info['votes']:
+            if not replay:
+                self.state_log.info("%s уже голосовал за репорт %s.", voter_address, report_id)
+            return
+        report_info['votes'][voter_address] = vote_type
+        report_info['tally'][vote_type] = report_info['tally'].get(vote_type, 0) + 1
+        if not replay:
+            self.state_log.debug("%s проголосовал '%s' за репорт %s.", voter_address, vote_type, report_id)
+        self._check_and_reward_rage_report(report_id, replay)
+
+    def _apply_transfer(self, tx, replay):
+        # Балансы переводов учитывает balance_ledger
+        if not replay:
+            self.state_log.debug("Транзакция перевода: %s -> %s Amount: %s", tx['sender'], tx['recipient'], tx['amount'])
+
+    _TX_HANDLERS = {
+        'stake': _apply_stake,
+        'unstake': _apply_unstake,
+        'rage_report': _apply_rage_report,
+        'vote_rage_report': _apply_vote,
+        'transfer': _apply_transfer,
+    }
 
-    def _check_and_reward_rage_report(self, report_id):
+    def _check_and_reward_rage_report(self, report_id, replay=False):
         if report_id not in self.pending_rage_reports:
             return
 
         report_info = self.pending_rage_reports[report_id]
+        outcome = self._rage_report_outcome(report_info)
 
-        approve_votes = sum(1 for vote_type in report_info['votes'].values() if vote_type == 'approve')
-        reject_votes = sum(1 for vote_type in report_info['votes'].values() if vote_type == 'reject')
-
-        if approve_votes >= 2 and reject_votes == 0:
+        if outcome == 'approved':
             reporter = report_info['report_data']['reporter_address']
-            reward_amount = 15
+            reward_amount = self.report_reward
 
-            self.new_transaction("Rage_Protocol_Reward", reporter, reward_amount, 'transfer')
-            print(
-                f"[{self.node_id}] SUCCESS: Rage Report {report_id} верифицирован! {reporter} получил {reward_amount} RAGE.")  # DEBUG -> SUCCESS
+            if not replay:
+                # report_id отличает награды одному репортеру за разные отчеты друг от друга
+                self.new_transaction("Rage_Protocol_Reward", reporter, reward_amount, 'transfer',
+                                     data={'report_id': report_id}, priority=True)
+                self.state_log.info("Rage Report %s верифицирован! %s получил %s RAGE.", report_id, reporter, reward_amount)
 
             del self.pending_rage_reports[report_id]
-        elif reject_votes >= 2:
+        elif outcome == 'rejected':
             reporter = report_info['report_data']['reporter_address']
-            print(
-                f"[{self.node_id}] INFO: Rage Report {report_id} отклонен! Возможно, штраф для {reporter}.")  # DEBUG -> INFO
+            if not replay:
+                self.state_log.info("Rage Report %s отклонен! Возможно, штраф для %s.", report_id, reporter)
             del self.pending_rage_reports[report_id]
 
-    def _recalculate_states_from_chain(self):
-        self.staked_balances = {}
-        self.pending_rage_reports = {}
-        for block in self.chain:
-            for tx in block['transactions']:
-                if tx['type'] == 'stake':
-                    sender = tx['sender']
-                    amount = tx['amount']
-                    self.staked_balances[sender] = self.staked_balances.get(sender, 0) + amount
-                elif tx['type'] == 'unstake':
-                    sender = tx['sender']
-                    amount = tx['amount']
-                    if self.staked_balances.get(sender, 0) >= amount:
-                        self.staked_balances[sender] -= amount
-                elif tx['type'] == 'rage_report':
-                    report_id = tx['data']['report_id']
-                    self.pending_rage_reports[report_id] = {
-                        'report_data': tx['data'],
-                        'votes': {}
-                    }
-                elif tx['type'] == 'vote_rage_report':
-                    report_id = tx['data']['report_id']
-                    voter_address = tx['data']['voter_address']
-                    vote_type = tx['data']['vote_type']
-                    if report_id in self.pending_rage_reports and voter_address not in \
-                            self.pending_rage_reports[report_id]['votes']:
-                        self.pending_rage_reports[report_id]['votes'][voter_address] = vote_type
-
-        reports_to_remove = []
-        for report_id, info in self.pending_rage_reports.items():
-            approve_votes = sum(1 for vote_type in info['votes'].values() if vote_type == 'approve')
-            reject_votes = sum(1 for vote_type in info['votes'].values() if vote_type == 'reject')
-            if (approve_votes >= 2 and reject_votes == 0) or reject_votes >= 2:
-                reports_to_remove.append(report_id)
-
-        for report_id in reports_to_remove:
-            del self.pending_rage_reports[report_id]
+    def _rage_report_outcome(self, report_info):
+        # Счетчики голосов поддерживаются при каждом голосе, поэтому решение принимается за O(1)
+        tally = report_info['tally']
+        if tally['approve'] >= self.approve_quorum and tally['reject'] == 0:
+            return 'approved'
+        if tally['reject'] >= self.reject_quorum:
+            return 'rejected'
+        return None
+
+    def _ensure_vote_tallies(self):
+        # Отчеты из состояния, сохраненного до появления счетчиков
+        for info in self.pending_rage_reports.values():
+            if 'tally' not in info:
+                votes = list(info['votes'].values())
+                info['tally'] = {'approve': votes.count('approve'), 'reject': votes.count('reject')}
+
+    def _recalculate_states_from_chain(self, start=0):
+        # start > 0: состояние уже восстановлено из чекпоинта на блоке start, переигрываем только хвост
+        if start == 0:
+            self.staked_balances = {}
+            self.pending_rage_reports = {}
+            self.balance_ledger.reset()
+            self.rage_index.reset()
+            self.tx_index.reset()
+        for block in itertools.islice(self.chain, start, None):
+            self._process_block_transactions(block, replay=True)
 
     def get_staked_balance(self, address):
-        return self.staked_balances.get(address, 0)
-
-    def get_balance(self, address):
-        balance = 0
-        for block in self.chain:
-            for tx in block['transactions']:
-                if tx['type'] == 'transfer':
-                    if tx['recipient'] == address:
-                        balance += tx['amount']
-                    if tx['sender'] == address:
-                        balance -= tx['amount']
-                elif tx['type'] == 'stake' and tx['sender'] == address:
-                    balance -= tx['amount']
-                elif tx['type'] == 'unstake' and tx['recipient'] == address:
-                    # Анстейк увеличивает баланс, так как токены возвращаются
-                    balance += tx['amount']
-        return balance
+        with self.lock.read():
+            return self.staked_balances.get(address, 0)
+
+    def get_balance(self, address, block_index=None):
+        with self.lock.read():
+            if block_index is None:
+                return self.balance_ledger.get(address)
+            return self.balance_ledger.get_at(address, block_index, self.chain)
+
+    def find_rage_report(self, report_id):
+        """Положение транзакции rage_report в цепочке: (индекс блока, номер транзакции) или None."""
+        with self.lock.read():
+            location = self.tx_index.get_report(report_id)
+        return tuple(location) if location is not None else None
+
+    def rage_report_exists(self, report_id):
+        """Есть ли репорт в цепочке или среди ожидающих транзакций (за него можно голосовать)."""
+        with self.lock.read():
+            return self.tx_index.get_report(report_id) is not None or self.mempool.get_report(report_id) is not None
+
+    def get_transaction(self, tx_id):
+        """Транзакция по id: словарь с транзакцией и ее положением в цепочке или None.
+
+        Для транзакции из пула block_index и position равны None.
+        """
+        with self.lock.read():
+            location = self.tx_index.get_transaction(tx_id)
+            if location is None:
+                tx = self.mempool.get(tx_id)
+                if tx is None:
+                    return None
+                return {'tx_id': tx_id, 'status': 'pending', 'block_index': None, 'position': None,
+                        'transaction': tx}
+            block_index, position = location
+            return {'tx_id': tx_id, 'status': 'confirmed', 'block_index': block_index, 'position': position,
+                    'block_hash': self.block_hashes[block_index - 1],
+                    'transaction': self.chain[block_index - 1]['transactions'][position]}
+
+    def get_transactions(self, tx_ids):
+        """Транзакции с указанными id из пула и цепочки; неизвестные id пропускаются."""
+        with self.lock.read():
+            found = (self.get_transaction(tx_id) for tx_id in tx_ids)
+            return [item['transaction'] for item in found if item is not None]
+
+    def get_rage_report(self, report_id):
+        """Rage-репорт по id: транзакция, положение в цепочке и состояние голосования или None.
+
+        status: 'pending' - репорт еще в пуле, 'voting' - в цепочке и ждет голосов,
+        'closed' - голосование завершено.
+        """
+        with self.lock.read():
+            location = self.tx_index.get_report(report_id)
+            if location is None:
+                found = self.mempool.get_report(report_id)
+                if found is None:
+                    return None
+                tx_id, tx = found
+                return {'report_id': report_id, 'tx_id': tx_id, 'status': 'pending', 'block_index': None,
+                        'position': None, 'transaction': tx}
+            block_index, position = location
+            tx = self.chain[block_index - 1]['transactions'][position]
+            report = {'report_id': report_id, 'tx_id': transaction_id(tx), 'status': 'closed',
+                      'block_index': block_index, 'position': position, 'transaction': tx}
+            info = self.pending_rage_reports.get(report_id)
+            if info is not None:
+                report.update(status='voting', current_votes=dict(info['votes']),
+                              approve_votes=info['tally']['approve'], reject_votes=info['tally']['reject'])
+            return report
+
+    def get_rage_report_proof(self, report_id):
+        """Доказательство включения rage-репорта: транзакция, путь Меркла и корень блока.
+
+        Возвращает None, если репорта нет в цепочке. Для блока без merkle_root
+        (созданного до его появления) путь равен None.
+        """
+        with self.lock.read():
+            found = self.find_rage_report(report_id)
+            if found is None:
+                return None
+            block_index, position = found
+            block = self.chain[block_index - 1]
+            block_hash = self.block_hashes[block_index - 1]
+        has_root = 'merkle_root' in block
+        return {
+            'report_id': report_id,
+            'block_index': block_index,
+            'block_hash': block_hash,
+            'position': position,
+            'transaction': block['transactions'][position],
+            'merkle_root': block.get('merkle_root'),
+            'proof': merkle_proof(block['transactions'], position) if has_root else None
+        }
+
+    def get_pending_rage_reports(self):
+        """Снимок ожидающих голосования репортов: [(report_id, данные, голоса, счетчики)]."""
+        with self.lock.read():
+            return [(report_id, info['report_data'], dict(info['votes']), dict(info['tally']))
+                    for report_id, info in self.pending_rage_reports.items()]
+
+    def get_pending_transactions(self, sender=None):
+        """Снимок пула: ([(tx_id, tx)], число транзакций, размер в байтах)."""
+        with self.lock.read():
+            items = self.mempool.by_sender(sender) if sender is not None else self.mempool.items()
+            return items, len(self.mempool), self.mempool.total_bytes
 
 
 app = Flask(__name__)
-node_identifier = str(uuid4()).replace('-', '')
-blockchain = ChatRageBlockchain(node_identifier)
+# Постоянный ID узла нужен, чтобы после перезапуска подхватить его данные с диска
+node_identifier = os.environ.get('CHATRAGE_NODE_ID') or str(uuid4()).replace('-', '')
+blockchain = ChatRageBlockchain(node_identifier, full_verify=os.environ.get('CHATRAGE_FULL_VERIFY') == '1')
+api_log = get_logger('api', node_identifier)
+request_duration = blockchain.metrics.histogram(
+    'chatrage_http_request_duration_seconds', 'Время обработки HTTP-запросов', labelnames=('endpoint',))
+balance_queries = blockchain.metrics.counter(
+    'chatrage_balance_queries_total', 'Запросы баланса', labelnames=('kind',))
+rage_index_queries = blockchain.metrics.counter(
+    'chatrage_rage_index_queries_total', 'Запрошенные rage-индексы', labelnames=('mode',))
+block_page_requests = blockchain.metrics.counter(
+    'chatrage_block_page_cache_requests_total', 'Запросы страниц блоков по результату поиска в кэше',
+    labelnames=('result',))
+# Сжатые страницы блоков: соседи, синхронизирующиеся с одной вершины, получают одни и те же байты
+block_page_cache = CompressedPageCache()
+# Порт, по которому соседи запрашивают объявленные этим узлом транзакции и блоки
+gossip = Gossip(blockchain, port=int(os.environ.get('CHATRAGE_PORT', 5000)))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    started = g.get('request_started')
+    if started is not None and request.endpoint is not None:
+        request_duration.observe(time.perf_counter() - started, endpoint=request.endpoint)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or not 200 <= response.status_code < 300 or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(blockchain.metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def mine_and_announce():
+    block, result = blockchain.mine_block(node_identifier)
+    if block is not None:
+        # Хеш вершины уже посчитан при добавлении блока; если вершина успела смениться, объявляем новую
+        gossip.announce_block(*blockchain.get_tip())
+    return block, result
+
+
+mining_jobs = MiningJobManager(mine_and_announce)
 
 
 @app.route('/mine', methods=['GET'])
 def mine():
-    last_block = blockchain.last_block
-    last_proof = last_block['proof']
-    proof = blockchain.proof_of_work(last_proof)
-
-    blockchain.new_transaction(
-        sender="0",
-        recipient=node_identifier,
-        amount=1,
-        tx_type='transfer'
-    )
-
-    previous_hash = blockchain.hash(last_block)
-    block = blockchain.create_block(proof, previous_hash)
-
+    job = mining_jobs.submit()
     response = {
-        'message': "Новый блок создан!",
-        'index': block['index'],
-        'transactions': block['transactions'],
-        'proof': block['proof'],
-        'previous_hash': block['previous_hash'],
-        'node_id': node_identifier  # НОВОЕ: Добавляем ID узла в ответ майнинга
+        'message': 'Майнинг запущен в фоне',
+        'job_id': job.id,
+        'status': job.status,
+        'node_id': node_identifier
     }
+    return jsonify(response), 202
+
+
+@app.route('/mine/<job_id>', methods=['GET'])
+def mining_job_status(job_id):
+    job = mining_jobs.get(job_id)
+    if job is None:
+        return 'Задание майнинга не найдено', 404
+
+    response = job.to_dict()
+    response['node_id'] = node_identifier
+    if job.status == 'done':
+        block = job.block
+        response.update({
+            'message': "Новый блок создан!",
+            'index': block['index'],
+            'transactions': block['transactions'],
+            'proof': block['proof'],
+            'previous_hash': block['previous_hash'],
+            'hashrate': job.mining['hashrate']
+        })
+    elif job.status == 'cancelled':
+        response['message'] = 'Майнинг отменен: цепочка была обновлена'
     return jsonify(response), 200
 
 
-@app.route('/transactions/new', methods=['POST'])
-def new_transaction_api():
-    values = request.get_json()
+def _transactions_from_values(values):
+    """Проверяет описание транзакции из запроса и строит транзакции для пула.
+
+    Построенные транзакции проходят validate_transaction, как и полученные от соседей.
+    Возвращает (список транзакций, None) или (None, текст ошибки).
+    """
     required_fields = ['sender', 'type']
-    if not all(field in values for field in required_fields):
-        return 'Отсутствуют необходимые поля транзакции: sender, type', 400
+    if not isinstance(values, dict) or not all(field in values for field in required_fields):
+        return None, 'Отсутствуют необходимые поля транзакции: sender, type'
 
     tx_type = values['type']
     sender = values['sender']
@@ -401,12 +1040,15 @@ def new_transaction_api():
     amount = values.get('amount', 0)
     data = values.get('data')
 
-    index = -1
     if tx_type == 'rage_report':
         required_rage_fields = ['content', 'reason_code']
-        if not (data and all(field in data for field in required_rage_fields)):  # Убедимся, что data не None
-            return 'Отсутствуют необходимые поля для Rage Report: content, reason_code', 400
-        index = blockchain.submit_rage_report(
+        if not (isinstance(data, dict) and all(field in data for field in required_rage_fields)):
+            return None, 'Отсутствуют необходимые поля для Rage Report: content, reason_code'
+        if not isinstance(data['content'], str):
+            return None, 'content должен быть строкой'
+        if not is_amount(data.get('stake_amount', 0)):
+            return None, 'stake_amount должен быть числом >= 0'
+        transactions = blockchain.rage_report_transactions(
             sender,
             data['content'],
             data['reason_code'],
@@ -414,30 +1056,246 @@ def new_transaction_api():
         )
     elif tx_type == 'vote_rage_report':
         required_vote_fields = ['report_id', 'vote_type']
-        if not (data and all(field in data for field in required_vote_fields)):  # Убедимся, что data не None
-            return 'Отсутствуют необходимые поля для голосования: report_id, vote_type', 400
-        index = blockchain.vote_on_rage_report(
-            sender,
-            data['report_id'],
-            data['vote_type']
-        )
+        if not (isinstance(data, dict) and all(field in data for field in required_vote_fields)):
+            return None, 'Отсутствуют необходимые поля для голосования: report_id, vote_type'
+        try:
+            transactions = [blockchain.vote_transaction(sender, data['report_id'], data['vote_type'])]
+        except ValueError as e:
+            return None, str(e)
     elif tx_type == 'transfer' or tx_type == 'stake' or tx_type == 'unstake':
-        if not recipient or amount <= 0:
-            return 'Для transfer/stake/unstake необходимы recipient и amount > 0', 400
-        index = blockchain.new_transaction(sender, recipient, amount, tx_type, data)
+        # Без nonce два одинаковых перевода имели бы один хеш и второй считался бы дубликатом.
+        # Клиент может передать свой nonce: тогда повтор того же запроса не создаст второй перевод
+        transactions = [{
+            'sender': sender,
+            'recipient': recipient,
+            'amount': amount,
+            'type': tx_type,
+            'data': data,
+            'nonce': values.get('nonce') or uuid4().hex
+        }]
     else:
-        return 'Неизвестный тип транзакции', 400
+        return None, 'Неизвестный тип транзакции'
+
+    for tx in transactions:
+        error = validate_transaction(tx)
+        if error:
+            return None, error
+    if tx_type == 'vote_rage_report' and not blockchain.rage_report_exists(data['report_id']):
+        return None, f"Rage Report {data['report_id']} не найден"
+    return transactions, None
 
-    response = {'message': f'Транзакция будет добавлена в блок {index}'}
+
+@app.route('/transactions/new', methods=['POST'])
+def new_transaction_api():
+    transactions, error = _transactions_from_values(request.get_json())
+    if error:
+        api_log.debug("Транзакция отклонена: %s", error)
+        return error, 400
+    added = blockchain.add_transactions(transactions)
+    gossip.announce_transactions(tx_id for tx_id, is_new in added if is_new)
+
+    index = blockchain.get_tip()[0] + 1
+    tx_ids = [tx_id for tx_id, _ in added]
+    if not any(is_new for _, is_new in added):
+        response = {
+            'message': 'Такая транзакция уже есть среди ожидающих или в цепочке',
+            'status': 'duplicate',
+            'tx_ids': tx_ids
+        }
+        return jsonify(response), 200
+    response = {
+        'message': f'Транзакция будет добавлена в блок {index}',
+        'status': 'accepted',
+        'tx_ids': tx_ids
+    }
     return jsonify(response), 201
 
 
+@app.route('/transactions/batch', methods=['POST'])
+def new_transactions_batch_api():
+    # Тело запроса: JSON-массив транзакций или NDJSON (по одной транзакции в строке)
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            items = request.get_json()
+    except ValueError:
+        return 'Тело запроса должно быть JSON-массивом или NDJSON', 400
+    if not isinstance(items, list):
+        return 'Тело запроса должно быть JSON-массивом или NDJSON', 400
+    if len(items) > MAX_TRANSACTION_BATCH:
+        return f'Слишком много транзакций в запросе (максимум {MAX_TRANSACTION_BATCH})', 400
+
+    # Сначала проверяем все элементы, затем добавляем валидные в пул одной операцией
+    results = []
+    accepted = []
+    for position, values in enumerate(items):
+        transactions, error = _transactions_from_values(values)
+        if error:
+            results.append({'position': position, 'status': 'rejected', 'error': error})
+        else:
+            results.append({'position': position, 'status': 'accepted', 'tx_ids': []})
+            accepted.append((results[-1], transactions))
+
+    added = blockchain.add_transactions([tx for _, transactions in accepted for tx in transactions])
+    gossip.announce_transactions(tx_id for tx_id, is_new in added if is_new)
+    added = iter(added)
+    for result, transactions in accepted:
+        for _ in transactions:
+            tx_id, is_new = next(added)
+            result['tx_ids'].append(tx_id)
+            if not is_new:
+                result['status'] = 'duplicate'
+
+    response = {
+        'results': results,
+        'accepted': sum(1 for result in results if result['status'] == 'accepted'),
+        'rejected': sum(1 for result in results if result['status'] == 'rejected'),
+        'block_index': blockchain.get_tip()[0] + 1,
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
+@app.route('/transactions/get', methods=['POST'])
+def get_transactions_api():
+    values = request.get_json(silent=True) or {}
+    tx_ids = values.get('tx_ids') if isinstance(values, dict) else None
+    if not isinstance(tx_ids, list):
+        return 'Пожалуйста, укажите список tx_ids', 400
+    if len(tx_ids) > MAX_TRANSACTION_BATCH:
+        return f'Слишком много id в запросе (максимум {MAX_TRANSACTION_BATCH})', 400
+    response = {
+        'transactions': blockchain.get_transactions(tx_id for tx_id in tx_ids if isinstance(tx_id, str)),
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
+@app.route('/transactions/pending', methods=['GET'])
+def pending_transactions_api():
+    items, count, size = blockchain.get_pending_transactions(request.args.get('sender'))
+    response = {
+        'transactions': [{'tx_id': tx_id, 'transaction': tx} for tx_id, tx in items],
+        'count': count,
+        'bytes': size,
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
+@app.route('/transactions/pending/<tx_id>', methods=['GET'])
+def pending_transaction_api(tx_id):
+    transaction = blockchain.mempool.get(tx_id)
+    if transaction is None:
+        return 'Транзакция не найдена среди ожидающих', 404
+    response = {
+        'tx_id': tx_id,
+        'transaction': transaction,
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
+def _prefers_msgpack():
+    # Блоки в msgpack компактнее и быстрее разбираются; отдаем его только тем, кто явно попросил
+    return msgpack_available() and request.accept_mimetypes.best_match(
+        ['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+
+
+def _negotiated_response(data):
+    if _prefers_msgpack():
+        return Response(dumps_msgpack(data), mimetype=MSGPACK_MIMETYPE)
+    return jsonify(data)
+
+
 @app.route('/chain', methods=['GET'])
 def full_chain():
+    if 'from' not in request.args and 'limit' not in request.args:
+        chain = blockchain.get_chain()
+        response = {
+            'chain': chain,
+            'length': len(chain),
+            'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
+        }
+        return _negotiated_response(response), 200
+
+    # Постраничный режим: ?from=<индекс блока>&limit=<число блоков>
+    # Индексы блоков начинаются с 1; limit ограничен с обеих сторон, иначе отрицательный
+    # limit превратился бы в срез "все, кроме последних" в обход MAX_CHAIN_PAGE
+    from_index = max(request.args.get('from', default=1, type=int), 1)
+    limit = max(min(request.args.get('limit', default=chatrage_sync.SYNC_PAGE_SIZE, type=int), MAX_CHAIN_PAGE), 1)
+    use_msgpack = _prefers_msgpack()
+    encoding = negotiate_encoding(request.accept_encodings)
+    chain, length, page_hash = blockchain.get_page(from_index, limit)
+    next_index = from_index + len(chain)
+    # Тело страницы зависит только от ее блоков, а не от вершины: пока ветка под страницей
+    # не сменилась, новые блоки кэш не сбрасывают. Длина цепочки и начало следующей
+    # страницы меняются с каждым блоком и уходят в заголовках
+    headers = {
+        'Vary': 'Accept-Encoding',
+        'X-Chain-Length': str(length),
+        'X-Chain-Next': str(next_index) if chain and next_index <= length else '',
+    }
+    key = (from_index, limit, page_hash, use_msgpack, encoding)
+    cached = block_page_cache.get(key)
+    if cached is None:
+        block_page_requests.inc(result='miss')
+        response = {
+            'chain': chain,
+            'from': from_index,
+            'node_id': node_identifier
+        }
+        body = dumps_msgpack(response) if use_msgpack else jsonify(response).get_data()
+        content_encoding = None
+        if encoding is not None and len(body) >= MIN_COMPRESS_SIZE:
+            body = compress(body, encoding)
+            content_encoding = encoding
+        block_page_cache.put(key, body, content_encoding)
+    else:
+        block_page_requests.inc(result='hit')
+        body, content_encoding = cached
+    if content_encoding is not None:
+        headers['Content-Encoding'] = content_encoding
+    return Response(body, mimetype=MSGPACK_MIMETYPE if use_msgpack else 'application/json', headers=headers), 200
+
+
+@app.route('/chain/stream', methods=['GET'])
+def stream_chain():
+    chain = blockchain.get_chain(request.args.get('from', default=1, type=int))
+
+    def generate():
+        # Блоки отдаются по одному в формате NDJSON, без сборки всего ответа в памяти
+        for block in chain:
+            yield json.dumps(block) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/chain/tip', methods=['GET'])
+def chain_tip():
+    length, last_hash = blockchain.get_tip()
     response = {
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain),
-        'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
+        'length': length,
+        'hash': last_hash,
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
+@app.route('/chain/locate', methods=['POST'])
+def locate_chain_fork():
+    values = request.get_json(silent=True)
+    locator = values.get('locator') if isinstance(values, dict) else None
+    if locator is None:
+        return 'Пожалуйста, укажите локатор цепочки', 400
+    if not isinstance(locator, list) or not all(
+            isinstance(entry, list) and len(entry) == 2 and type(entry[0]) is int and isinstance(entry[1], str)
+            for entry in locator):
+        return 'Локатор должен быть списком пар [индекс, хеш]', 400
+    response = {
+        'height': blockchain.find_fork_point(locator),
+        'node_id': node_identifier
     }
     return jsonify(response), 200
 
@@ -454,37 +1312,69 @@ def register_nodes():
 
     response = {
         'message': 'Новые узлы добавлены',
-        'total_nodes': list(blockchain.nodes),
+        'total_nodes': sorted(blockchain.nodes),
         'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
     }
     return jsonify(response), 201
 
 
+@app.route('/nodes', methods=['GET'])
+def list_nodes():
+    peers = blockchain.peers.get_stats()
+    response = {
+        'nodes': [dict(peers[node], node=node, available=peers[node]['backoff'] == 0)
+                  for node in sorted(peers)],
+        'preferred': blockchain.get_nodes(),
+        'count': len(peers),
+        'node_id': node_identifier
+    }
+    return jsonify(response), 200
+
+
 @app.route('/nodes/resolve', methods=['GET'])
 def resolve_conflicts():
     replaced = blockchain.resolve_conflicts()
-
+    length, last_hash = blockchain.get_tip()
     if replaced:
-        response = {
-            'message': 'Наша цепочка была заменена',
-            'new_chain': blockchain.chain,
-            'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
-        }
-    else:
-        response = {
-            'message': 'Наша цепочка является авторитетной',
-            'chain': blockchain.chain,
-            'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
-        }
+        gossip.announce_block(length, last_hash)
+
+    # Цепочку целиком не возвращаем: клиенту достаточно новой вершины
+    response = {
+        'message': 'Наша цепочка была заменена' if replaced else 'Наша цепочка является авторитетной',
+        'replaced': replaced,
+        'length': length,
+        'hash': last_hash,
+        'peers': blockchain.peer_client.get_stats(),
+        'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
+    }
     return jsonify(response), 200
 
 
+@app.route('/gossip/announce', methods=['POST'])
+def gossip_announce():
+    values = request.get_json(silent=True)
+    if not isinstance(values, dict) or not isinstance(values.get('port'), int):
+        return 'Объявление должно содержать port отправителя', 400
+    # Недостающее запрашиваем у отправителя по его адресу и объявленному порту
+    requested_transactions, requested_blocks = gossip.handle_announcement(
+        f"{request.remote_addr}:{values['port']}", values)
+    response = {
+        'requested_transactions': requested_transactions,
+        'requested_blocks': requested_blocks,
+        'node_id': node_identifier
+    }
+    return jsonify(response), 202
+
+
 @app.route('/balance/<address>', methods=['GET'])
 def get_wallet_balance(address):
-    balance = blockchain.get_balance(address)
+    block_index = request.args.get('at', type=int)
+    balance = blockchain.get_balance(address, block_index)
+    balance_queries.inc(kind='current' if block_index is None else 'historical')
     response = {
         'address': address,
         'balance': balance,
+        'block_index': block_index if block_index is not None else blockchain.get_tip()[0],
         'message': f'Баланс кошелька {address} составляет {balance} RAGE.',
         'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
     }
@@ -494,6 +1384,7 @@ def get_wallet_balance(address):
 @app.route('/staked_balance/<address>', methods=['GET'])
 def get_wallet_staked_balance(address):
     staked_balance = blockchain.get_staked_balance(address)
+    balance_queries.inc(kind='staked')
     response = {
         'address': address,
         'staked_balance': staked_balance,
@@ -505,36 +1396,88 @@ def get_wallet_staked_balance(address):
 
 @app.route('/rage_index', methods=['POST'])
 def get_current_rage_index():
-    values = request.get_json()
+    values = request.get_json(silent=True)
+    if not isinstance(values, dict):
+        return 'Тело запроса должно быть JSON-объектом', 400
+    # Пакетный режим: список контента или готовых хешей в одном запросе
+    if 'contents' in values or 'content_hashes' in values:
+        contents = values.get('contents', [])
+        hashes = values.get('content_hashes', [])
+        if not all(isinstance(items, list) and all(isinstance(item, str) for item in items)
+                   for items in (contents, hashes)):
+            return '"contents" и "content_hashes" должны быть списками строк', 400
+        if len(contents) + len(hashes) > MAX_RAGE_INDEX_BATCH:
+            return f'Слишком много хешей в запросе (максимум {MAX_RAGE_INDEX_BATCH})', 400
+        content_hashes = [hashlib.sha256(content.encode()).hexdigest() for content in contents] + hashes
+        rage_index_queries.inc(len(content_hashes), mode='batch')
+        response = {
+            'rage_indexes': blockchain.get_rage_indexes(content_hashes),
+            'count': len(content_hashes),
+            'node_id': node_identifier
+        }
+        return jsonify(response), 200
+
     content_to_hash = values.get('content')
-    if not content_to_hash:
+    if not content_to_hash or not isinstance(content_to_hash, str):
         return 'Необходимо указать "content" для хеширования', 400
 
     content_hash = hashlib.sha256(content_to_hash.encode()).hexdigest()
-    rage_count = blockchain.get_rage_index(content_hash)
+    rage_index = blockchain.get_rage_indexes([content_hash])[0]
+    rage_count = rage_index['rage_index']
+    rage_index_queries.inc(mode='single')
 
     response = {
         'content_hash': content_hash,
         'rage_index': rage_count,
+        'reasons': rage_index['reasons'],
         'message': f'Rage Index для данного контента: {rage_count}',
         'node_id': node_identifier  # НОВОЕ: Добавляем ID узла
     }
     return jsonify(response), 200
 
 
+@app.route('/tx/<tx_id>', methods=['GET'])
+def transaction_api(tx_id):
+    transaction = blockchain.get_transaction(tx_id)
+    if transaction is None:
+        return 'Транзакция не найдена', 404
+    transaction['node_id'] = node_identifier
+    return jsonify(transaction), 200
+
+
+@app.route('/report/<report_id>', methods=['GET'])
+def rage_report_api(report_id):
+    report = blockchain.get_rage_report(report_id)
+    if report is None:
+        return 'Rage Report не найден', 404
+    report['node_id'] = node_identifier
+    return jsonify(report), 200
+
+
+@app.route('/proof/<report_id>', methods=['GET'])
+def rage_report_proof(report_id):
+    proof = blockchain.get_rage_report_proof(report_id)
+    if proof is None:
+        return 'Rage Report не найден в цепочке', 404
+    if proof['proof'] is None:
+        return 'Блок с этим Rage Report создан без merkle_root, доказательство построить нельзя', 409
+    proof['node_id'] = node_identifier
+    return jsonify(proof), 200
+
+
 @app.route('/pending_rage_reports', methods=['GET'])
 def get_pending_rage_reports():
     reports = []
-    for report_id, info in blockchain.pending_rage_reports.items():
-        report_data = info['report_data']
-        votes = info['votes']
+    for report_id, report_data, votes, tally in blockchain.get_pending_rage_reports():
         reports.append({
             'report_id': report_id,
             'reporter_address': report_data['reporter_address'],
             'content_hash': report_data['content_hash'],
             'reason_code': report_data['reason_code'],
             'stake_amount': report_data['stake_amount'],
-            'current_votes': votes
+            'current_votes': votes,
+            'approve_votes': tally['approve'],
+            'reject_votes': tally['reject']
         })
     response = {
         'pending_reports': reports,
@@ -549,7 +1492,31 @@ if __name__ == '__main__':
 
     parser = ArgumentParser()
     parser.add_argument('-p', '--port', default=5000, type=int, help='порт для запуска узла')
+    parser.add_argument('--mining-workers', default=0, type=int,
+                        help='число процессов для майнинга (0 - майнинг в процессе узла)')
+    parser.add_argument('--full-verify', action='store_true',
+                        help='проверить всю цепочку и переиграть все транзакции вместо загрузки из чекпоинта')
+    parser.add_argument('--workers', default=DEFAULT_WORKERS, type=int,
+                        help='число потоков, обслуживающих HTTP-запросы')
+    parser.add_argument('--debug', action='store_true',
+                        help='запустить dev-сервер Flask с отладчиком и перезагрузкой кода')
+    parser.add_argument('--log-level', default=DEFAULT_LEVEL,
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper,
+                        help='уровень логирования (DEBUG - сообщения о каждой транзакции)')
     args = parser.parse_args()
+    # Процессы майнинга порождаются через fork: до запуска каких-либо потоков, в том числе потока логов
+    blockchain.miner = create_miner(args.mining_workers)
+    setup_logging(args.log_level)
     port = args.port
+    gossip.port = port
+    if args.full_verify:
+        blockchain.verify_full()
 
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    try:
+        if args.debug:
+            app.run(host='0.0.0.0', port=port, debug=True)
+        else:
+            serve(app, host='0.0.0.0', port=port, workers=args.workers)
+    finally:
+        blockchain.flush_checkpoint()
+        blockchain.block_log.close()
\ No newline at end of file
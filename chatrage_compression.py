@@ -0,0 +1,83 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import zstandard
+except ImportError:  # zstandard необязателен: без него ответы сжимаются gzip
+    zstandard = None
+
+# Меньшие ответы отдаем как есть: выигрыш не окупает заголовки и время сжатия
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/msgpack', 'application/x-ndjson', 'text/plain')
+# Кодировки ответов, которые умеет разбирать клиент узла (urllib3), для заголовка Accept-Encoding
+PEER_ACCEPT_ENCODING = ACCEPT_ENCODING
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_MAX_ENTRIES = 1024
+
+
+def supported_encodings():
+    """Кодировки, которыми узел может сжать ответ, в порядке предпочтения."""
+    return ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """Выбирает кодировку по разобранному заголовку Accept-Encoding (werkzeug Accept) или None."""
+    return accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == 'gzip':
+        # mtime=0: одинаковые данные дают одинаковые байты
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Неподдерживаемая кодировка: {encoding}")
+
+
+class CompressedPageCache:
+    """LRU-кэш готовых (сериализованных и, возможно, сжатых) тел ответов, ограниченный суммарным размером.
+
+    Ключ должен однозначно определять содержимое. Вместе с телом хранится
+    кодировка, которой оно сжато (None - не сжато).
+    """
+
+    def __init__(self, max_bytes=PAGE_CACHE_MAX_BYTES, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """(тело, кодировка) или None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, body, content_encoding=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous[0])
+            self._items[key] = (body, content_encoding)
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes or len(self._items) > self.max_entries:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
@@ -0,0 +1,214 @@
+"""Распространение новых транзакций и блоков между узлами (gossip).
+
+Узел рассылает соседям не сами данные, а их идентификаторы: id транзакций и
+[индекс, хеш] вершины цепочки. Сосед запрашивает только то, чего у него нет:
+транзакции - через /transactions/get, блоки - синхронизацией от общего предка
+(sync_from_peer), без передачи всей цепочки. Получив новое, он объявляет его
+своим соседям.
+
+Объявления копятся batch_interval секунд и уходят одним запросом не более чем
+fanout случайным соседям. Уже виденные id отбрасываются по множеству seen, из
+которого при переполнении вытесняются давно не встречавшиеся (LRU).
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from chatrage_logging import get_logger
+from chatrage_mempool import transaction_id, validate_transaction
+
+GOSSIP_FANOUT = 8
+GOSSIP_BATCH_INTERVAL = 0.1
+# Не больше стольких id транзакций в одном объявлении
+GOSSIP_MAX_BATCH = 1000
+SEEN_CAPACITY = 100000
+FETCH_WORKERS = 4
+
+log = get_logger('sync')
+
+
+class SeenSet:
+    """Множество недавно виденных id ограниченного размера с вытеснением по LRU."""
+
+    def __init__(self, capacity=SEEN_CAPACITY):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def add(self, key):
+        """Запоминает key. Возвращает True, если его еще не видели."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return False
+            self._items[key] = None
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class Gossip:
+    """Объявления о новых транзакциях и блоках узла blockchain и обработка объявлений соседей.
+
+    port - порт, на котором этот узел принимает запросы: по нему соседи
+    запрашивают объявленные данные.
+    """
+
+    def __init__(self, blockchain, port, fanout=GOSSIP_FANOUT, batch_interval=GOSSIP_BATCH_INTERVAL,
+                 max_batch=GOSSIP_MAX_BATCH, seen_capacity=SEEN_CAPACITY):
+        self.blockchain = blockchain
+        self.port = port
+        self.fanout = fanout
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.seen = SeenSet(seen_capacity)
+        self._lock = threading.Lock()
+        self._pending_transactions = []
+        self._pending_block = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='gossip')
+
+    def announce_transactions(self, tx_ids):
+        tx_ids = [tx_id for tx_id in tx_ids if self.seen.add(tx_id)]
+        if not tx_ids:
+            return
+        with self._lock:
+            self._pending_transactions.extend(tx_ids)
+        self._schedule()
+
+    def announce_block(self, index, block_hash):
+        """Объявляет вершину цепочки. Соседу достаточно последней: промежуточные блоки он загрузит сам."""
+        if not self.seen.add(block_hash):
+            return
+        with self._lock:
+            if self._pending_block is None or index > self._pending_block[0]:
+                self._pending_block = [index, block_hash]
+        self._schedule()
+
+    def _schedule(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gossip-flush', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Даем накопиться объявлениям, пришедшим почти одновременно
+            time.sleep(self.batch_interval)
+            with self._lock:
+                self._wakeup.clear()
+                tx_ids, self._pending_transactions = self._pending_transactions, []
+                block, self._pending_block = self._pending_block, None
+            try:
+                self.flush(tx_ids, block)
+            except Exception:
+                log.exception("Не удалось разослать объявления")
+
+    def flush(self, tx_ids, block=None):
+        """Рассылает объявления о tx_ids и вершине block случайным соседям."""
+        nodes = self.blockchain.get_nodes()
+        if len(nodes) > self.fanout:
+            nodes = random.sample(nodes, self.fanout)
+        if not nodes or self.port is None:
+            return
+        batches = [tx_ids[start:start + self.max_batch] for start in range(0, len(tx_ids), self.max_batch)]
+        for number, batch in enumerate(batches or [[]]):
+            announcement = {'port': self.port, 'transactions': batch, 'blocks': []}
+            if number == 0 and block is not None:
+                announcement['blocks'].append(block)
+            if not announcement['transactions'] and not announcement['blocks']:
+                continue
+            for node in nodes:
+                self.blockchain.peer_client.executor.submit(self._announce_to, node, announcement)
+
+    def _announce_to(self, node, announcement):
+        try:
+            self.blockchain.peer_client.announce(node, announcement)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.debug("Объявление для %s не доставлено: %s", node, e)
+
+    def handle_announcement(self, node, announcement):
+        """Принимает объявление соседа node и в фоне загружает у него недостающее.
+
+        Возвращает (число запрошенных транзакций, запрошены ли блоки).
+        """
+        tx_ids = [tx_id for tx_id in announcement.get('transactions') or ()
+                  if isinstance(tx_id, str) and self.seen.add(tx_id)]
+        tx_ids = self.blockchain.unknown_transactions(tx_ids)
+        if tx_ids:
+            self.executor.submit(self._fetch_transactions, node, tx_ids)
+
+        best = None
+        for block in announcement.get('blocks') or ():
+            if not (isinstance(block, list) and len(block) == 2
+                    and isinstance(block[0], int) and isinstance(block[1], str)):
+                continue
+            if best is None or block[0] > best[0]:
+                best = block
+        fetch_block = (best is not None and best[0] > self.blockchain.get_tip()[0]
+                       and not self.blockchain.knows_block(*best) and self.seen.add(best[1]))
+        if best is not None:
+            self.blockchain.peers.record_tip(node, best[0])
+        if fetch_block:
+            self.executor.submit(self._sync_block, node, best[0], best[1])
+        return len(tx_ids), fetch_block
+
+    def _fetch_transactions(self, node, tx_ids):
+        try:
+            transactions = self.blockchain.peer_client.fetch_transactions(node, tx_ids)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            log.debug("Не удалось получить транзакции у %s: %s", node, e)
+            transactions = []
+        if not isinstance(transactions, list):
+            transactions = []
+        wanted = set(tx_ids)
+        # Принимаем только то, что запрашивали: id транзакции - хеш ее содержимого
+        accepted = []
+        for tx in transactions:
+            error = validate_transaction(tx)
+            if error:
+                log.info("Отброшена транзакция от %s: %s", node, error)
+            elif transaction_id(tx) in wanted:
+                accepted.append(tx)
+        results = self.blockchain.add_transactions(accepted) if accepted else []
+        received = {tx_id for tx_id, _ in results}
+        # Недополученное можно будет запросить у другого соседа, объявившего то же самое
+        for tx_id in wanted - received:
+            self.seen.discard(tx_id)
+        new_ids = [tx_id for tx_id, is_new in results if is_new]
+        if new_ids:
+            with self._lock:
+                self._pending_transactions.extend(new_ids)
+            self._schedule()
+
+    def _sync_block(self, node, index, block_hash):
+        try:
+            changed = self.blockchain.sync_from_peer(node, index)
+        except Exception as e:
+            log.debug("Не удалось загрузить блоки у %s: %s", node, e)
+            self.seen.discard(block_hash)
+            return
+        if changed:
+            length, last_hash = self.blockchain.get_tip()
+            self.seen.add(last_hash)
+            with self._lock:
+                if self._pending_block is None or length > self._pending_block[0]:
+                    self._pending_block = [length, last_hash]
+            self._schedule()
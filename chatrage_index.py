@@ -0,0 +1,160 @@
+from bisect import bisect_right
+
+from chatrage_mempool import transaction_id
+
+BALANCE_SNAPSHOT_INTERVAL = 100
+
+
+def balance_deltas(tx):
+    """Изменения балансов, которые вносит транзакция: пары (адрес, сумма)."""
+    if tx['type'] == 'transfer':
+        return ((tx['recipient'], tx['amount']), (tx['sender'], -tx['amount']))
+    if tx['type'] == 'stake':
+        return ((tx['sender'], -tx['amount']),)
+    if tx['type'] == 'unstake':
+        # Анстейк увеличивает баланс, так как токены возвращаются
+        return ((tx['recipient'], tx['amount']),)
+    return ()
+
+
+class BalanceLedger:
+    """Инкрементальный реестр балансов по адресам.
+
+    Каждые snapshot_interval блоков запоминаются балансы только тех адресов,
+    что изменились за интервал: история адреса - пары (высота, баланс).
+    Запрос "баланс на блок N" берет баланс адреса на ближайшей границе
+    интервала и переигрывает не больше snapshot_interval блоков, а память
+    растет с числом изменений, а не с числом адресов на каждый интервал.
+    """
+
+    def __init__(self, snapshot_interval=BALANCE_SNAPSHOT_INTERVAL):
+        self.snapshot_interval = snapshot_interval
+        self.reset()
+
+    def reset(self):
+        self.balances = {}
+        self.height = 0
+        # Полные балансы на высоте, с которой ведется история (0 или высота чекпоинта)
+        self._base = {}
+        self._base_height = 0
+        self._history = {}
+        self._changed = set()
+
+    def restore(self, balances, height):
+        """Восстанавливает реестр из чекпоинта состояния на блоке height."""
+        self.reset()
+        self.balances = dict(balances)
+        self.height = height
+        self._base = dict(balances)
+        self._base_height = height
+
+    def _add_snapshot(self):
+        for address in self._changed:
+            heights, balances = self._history.setdefault(address, ([], []))
+            heights.append(self.height)
+            balances.append(self.balances[address])
+        self._changed.clear()
+
+    def apply_block(self, block):
+        for tx in block['transactions']:
+            for address, delta in balance_deltas(tx):
+                self.balances[address] = self.balances.get(address, 0) + delta
+                self._changed.add(address)
+        self.height = block['index']
+        if self.height % self.snapshot_interval == 0:
+            self._add_snapshot()
+
+    def get(self, address):
+        return self.balances.get(address, 0)
+
+    def _snapshot_balance(self, address, height):
+        """Баланс адреса на границе интервала height (не ниже начала истории)."""
+        history = self._history.get(address)
+        if history is not None:
+            position = bisect_right(history[0], height) - 1
+            if position >= 0:
+                return history[1][position]
+        return self._base.get(address, 0)
+
+    def get_at(self, address, block_index, chain):
+        """Баланс адреса после блока block_index (индексы блоков начинаются с 1)."""
+        if block_index >= self.height:
+            return self.get(address)
+        if block_index <= 0:
+            return 0
+        if block_index >= self._base_height:
+            base = max(block_index - block_index % self.snapshot_interval, self._base_height)
+            balance = self._snapshot_balance(address, base)
+        else:
+            # После загрузки из чекпоинта истории до него нет: переигрываем цепочку с начала
+            base = 0
+            balance = 0
+        for block in chain[base:block_index]:
+            for tx in block['transactions']:
+                for tx_address, delta in balance_deltas(tx):
+                    if tx_address == address:
+                        balance += delta
+        return balance
+
+
+class RageIndex:
+    """Индекс rage-репортов в цепочке: content_hash -> количество и разбивка по reason_code."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.reasons = {}
+
+    def restore(self, counts, reasons):
+        self.counts = dict(counts)
+        self.reasons = {content_hash: dict(by_reason) for content_hash, by_reason in reasons.items()}
+
+    def apply_block(self, block):
+        for tx in block['transactions']:
+            if tx['type'] == 'rage_report':
+                content_hash = tx['data']['content_hash']
+                reason_code = tx['data']['reason_code']
+                self.counts[content_hash] = self.counts.get(content_hash, 0) + 1
+                by_reason = self.reasons.setdefault(content_hash, {})
+                by_reason[reason_code] = by_reason.get(reason_code, 0) + 1
+
+    def get(self, content_hash):
+        return self.counts.get(content_hash, 0)
+
+    def get_reasons(self, content_hash):
+        return dict(self.reasons.get(content_hash, {}))
+
+
+class TransactionIndex:
+    """Положение транзакций в цепочке: tx_id -> [индекс блока, номер транзакции в блоке].
+
+    Отдельно ведется report_id -> то же положение для транзакций rage_report.
+    Если одинаковая транзакция попала в несколько блоков, хранится последнее вхождение.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = {}
+        self.reports = {}
+
+    def restore(self, transactions, reports):
+        self.transactions = dict(transactions)
+        self.reports = dict(reports)
+
+    def apply_block(self, block):
+        block_index = block['index']
+        for position, tx in enumerate(block['transactions']):
+            location = [block_index, position]
+            self.transactions[transaction_id(tx)] = location
+            if tx['type'] == 'rage_report':
+                self.reports[tx['data']['report_id']] = location
+
+    def get_transaction(self, tx_id):
+        return self.transactions.get(tx_id)
+
+    def get_report(self, report_id):
+        return self.reports.get(report_id)
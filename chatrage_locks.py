@@ -0,0 +1,98 @@
+import threading
+
+
+class _LockGuard:
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release()
+        return False
+
+
+class ReadWriteLock:
+    """Реентерабельная блокировка чтения/записи.
+
+    Читателей может быть сколько угодно одновременно, писатель - один и без
+    читателей. Ожидающий писатель не пропускает новых читателей вперед, чтобы
+    поток запросов на чтение не откладывал запись бесконечно.
+
+    Поток, держащий запись, может повторно брать и запись, и чтение. Поток,
+    держащий только чтение, может повторно брать чтение, но не запись: повышение
+    блокировки ведет к взаимоблокировке двух таких потоков, поэтому запрещено.
+
+        with lock.read():
+            ...
+        with lock.write():
+            ...
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        # Глубина захвата чтения по потокам
+        self._readers = {}
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._read_guard = _LockGuard(self.acquire_read, self.release_read)
+        self._write_guard = _LockGuard(self.acquire_write, self.release_write)
+
+    def read(self):
+        return self._read_guard
+
+    def write(self):
+        return self._write_guard
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Нельзя взять блокировку записи, удерживая блокировку чтения")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError("Блокировка записи удерживается другим потоком")
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._condition.notify_all()
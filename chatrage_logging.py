@@ -0,0 +1,75 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOGGER_NAME = 'chatrage'
+# Подсистемы узла; у каждой свой логгер chatrage.<подсистема> со своим уровнем
+SUBSYSTEMS = ('mining', 'sync', 'state', 'api')
+# На рабочем узле сообщения о каждой транзакции (INFO/DEBUG) не форматируются вовсе
+DEFAULT_LEVEL = 'WARNING'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(node_id)s] %(message)s'
+
+_listener = None
+
+
+class _NodeIdFilter(logging.Filter):
+    """Подставляет node_id по умолчанию для записей, пришедших не через адаптер узла."""
+
+    def filter(self, record):
+        if not hasattr(record, 'node_id'):
+            record.node_id = '-'
+        return True
+
+
+def get_logger(subsystem, node_id=None):
+    """Логгер подсистемы. С node_id возвращает адаптер, добавляющий ID узла в каждую запись.
+
+    Сообщения передаются в %-стиле (log.info('... %s', value)), чтобы строка
+    форматировалась только если уровень включен.
+    """
+    logger = logging.getLogger(f'{LOGGER_NAME}.{subsystem}')
+    if node_id is None:
+        return logger
+    return logging.LoggerAdapter(logger, {'node_id': node_id})
+
+
+def setup_logging(level=DEFAULT_LEVEL, stream=None, levels=None):
+    """Настраивает вывод логов узла через очередь.
+
+    Поток, вызвавший логгер, только кладет запись в очередь; форматирование и
+    запись в stream (по умолчанию stderr) выполняет отдельный поток QueueListener.
+    levels - уровни отдельных подсистем, например {'sync': 'DEBUG'}.
+    """
+    global _listener
+    stop_logging()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(_NodeIdFilter())
+    log_queue = queue.SimpleQueue()
+
+    root = logging.getLogger(LOGGER_NAME)
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+    for subsystem, subsystem_level in (levels or {}).items():
+        get_logger(subsystem).setLevel(
+            subsystem_level.upper() if isinstance(subsystem_level, str) else subsystem_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Останавливает поток записи логов, дописав все, что осталось в очереди."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
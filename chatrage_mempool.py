@@ -0,0 +1,200 @@
+import hashlib
+import json
+import math
+from collections import OrderedDict
+
+from chatrage_codec import intern_transaction
+
+MEMPOOL_MAX_COUNT = 50000
+MEMPOOL_MAX_BYTES = 32 * 1024 * 1024
+BLOCK_MAX_COUNT = 5000
+BLOCK_MAX_BYTES = 1024 * 1024
+VOTE_TYPES = ('approve', 'reject')
+REPORT_TEXT_FIELDS = ('report_id', 'content_hash', 'reason_code', 'reporter_address')
+MAX_NONCE_LENGTH = 64
+# Целые, которые умеет записать msgpack (формат журнала блоков по умолчанию)
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 64 - 1
+
+
+def canonical_transaction_bytes(tx):
+    return json.dumps(tx, sort_keys=True).encode()
+
+
+def transaction_id(tx):
+    return hashlib.sha256(canonical_transaction_bytes(tx)).hexdigest()
+
+
+def is_amount(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return MIN_INTEGER <= value <= MAX_INTEGER
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def _fits_block_log(value):
+    """Все целые внутри value (в том числе во вложенных объектах) помещаются в запись журнала."""
+    if isinstance(value, dict):
+        return all(_fits_block_log(item) for item in value.values())
+    if isinstance(value, list):
+        return all(_fits_block_log(item) for item in value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return MIN_INTEGER <= value <= MAX_INTEGER
+    return True
+
+
+def validate_transaction(tx):
+    """Проверяет поля транзакции, которые читает обработка блока. Возвращает текст ошибки или None.
+
+    Проверка одна для транзакций из API и от соседей: транзакция, на которой
+    упадет применение блока, не должна попасть в пул.
+    """
+    if not isinstance(tx, dict) or not isinstance(tx.get('sender'), str) or not tx['sender']:
+        return 'Отсутствуют необходимые поля транзакции: sender, type'
+    if not _fits_block_log(tx):
+        return f'Целые числа в транзакции должны быть в диапазоне [{MIN_INTEGER}, {MAX_INTEGER}]'
+    tx_type = tx.get('type')
+    data = tx.get('data')
+    if tx_type in ('transfer', 'stake', 'unstake'):
+        recipient = tx.get('recipient')
+        amount = tx.get('amount')
+        if not isinstance(recipient, str) or not recipient or not is_amount(amount) or amount <= 0:
+            return 'Для transfer/stake/unstake необходимы recipient и amount > 0'
+        if data is not None and not isinstance(data, dict):
+            return 'Поле data должно быть объектом'
+        nonce = tx.get('nonce')
+        if nonce is not None and not (isinstance(nonce, str) and 0 < len(nonce) <= MAX_NONCE_LENGTH):
+            return f'nonce должен быть непустой строкой не длиннее {MAX_NONCE_LENGTH} символов'
+        return None
+    if tx_type == 'rage_report':
+        if not isinstance(data, dict):
+            return 'Отсутствуют данные Rage Report'
+        if not all(isinstance(data.get(field), str) for field in REPORT_TEXT_FIELDS):
+            return 'Rage Report должен содержать ' + ', '.join(REPORT_TEXT_FIELDS)
+        if not is_amount(data.get('stake_amount')) or data['stake_amount'] < 0:
+            return 'stake_amount должен быть числом >= 0'
+        if data['reporter_address'] != tx['sender']:
+            return 'reporter_address должен совпадать с отправителем'
+        return None
+    if tx_type == 'vote_rage_report':
+        if not isinstance(data, dict) or not isinstance(data.get('report_id'), str):
+            return 'Отсутствуют необходимые поля для голосования: report_id, vote_type'
+        if data.get('vote_type') not in VOTE_TYPES:
+            return "Тип голоса должен быть 'approve' или 'reject'."
+        if data.get('voter_address') != tx['sender']:
+            return 'voter_address должен совпадать с отправителем'
+        return None
+    return 'Неизвестный тип транзакции'
+
+
+class Mempool:
+    """Пул ожидающих транзакций с индексом по id и по отправителю.
+
+    Одинаковые транзакции (с одинаковым хешем) хранятся один раз. При
+    переполнении вытесняются самые старые транзакции без приоритета.
+    Приоритетные (протокольные награды) не вытесняются и первыми попадают в блок.
+    """
+
+    def __init__(self, max_count=MEMPOOL_MAX_COUNT, max_bytes=MEMPOOL_MAX_BYTES):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self._txs = OrderedDict()
+        self._sizes = {}
+        self._priority = OrderedDict()
+        self._by_sender = {}
+        # report_id -> tx_id транзакций rage_report, еще не попавших в блок
+        self._reports = {}
+        self.total_bytes = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._txs)
+
+    def __contains__(self, tx_id):
+        return tx_id in self._txs
+
+    def __iter__(self):
+        return iter(self._txs.values())
+
+    def get(self, tx_id):
+        return self._txs.get(tx_id)
+
+    def items(self):
+        return list(self._txs.items())
+
+    def by_sender(self, sender):
+        return [(tx_id, self._txs[tx_id]) for tx_id in self._by_sender.get(sender, ())]
+
+    def get_report(self, report_id):
+        """Ожидающая транзакция rage_report с этим report_id: (tx_id, tx) или None."""
+        tx_id = self._reports.get(report_id)
+        return (tx_id, self._txs[tx_id]) if tx_id is not None else None
+
+    def add(self, tx, priority=False):
+        """Добавляет транзакцию. Возвращает (tx_id, добавлена ли она)."""
+        tx_id = transaction_id(intern_transaction(tx))
+        if tx_id in self._txs:
+            return tx_id, False
+        size = len(canonical_transaction_bytes(tx))
+        self._txs[tx_id] = tx
+        self._sizes[tx_id] = size
+        self.total_bytes += size
+        self._by_sender.setdefault(tx['sender'], {})[tx_id] = None
+        if tx['type'] == 'rage_report':
+            self._reports[tx['data']['report_id']] = tx_id
+        if priority:
+            self._priority[tx_id] = None
+        self._evict()
+        return tx_id, True
+
+    def _evict(self):
+        while len(self._txs) > self.max_count or self.total_bytes > self.max_bytes:
+            victim = next((tx_id for tx_id in self._txs if tx_id not in self._priority), None)
+            if victim is None:
+                return
+            self._discard(victim)
+            self.evicted += 1
+
+    def _discard(self, tx_id):
+        tx = self._txs.pop(tx_id, None)
+        if tx is None:
+            return
+        self.total_bytes -= self._sizes.pop(tx_id)
+        self._priority.pop(tx_id, None)
+        sender_ids = self._by_sender.get(tx['sender'])
+        if sender_ids is not None:
+            sender_ids.pop(tx_id, None)
+            if not sender_ids:
+                del self._by_sender[tx['sender']]
+        if tx['type'] == 'rage_report' and self._reports.get(tx['data']['report_id']) == tx_id:
+            del self._reports[tx['data']['report_id']]
+
+    def remove(self, tx_ids):
+        for tx_id in tx_ids:
+            self._discard(tx_id)
+
+    def build_template(self, max_count=BLOCK_MAX_COUNT, max_bytes=BLOCK_MAX_BYTES):
+        """Шаблон блока: список (tx_id, tx) в пределах лимитов.
+
+        Остальные транзакции идут в порядке поступления и без пропусков, чтобы
+        зависимые транзакции (стейк перед репортом, репорт перед голосом) не
+        оказались в блоке раньше тех, от которых зависят.
+        """
+        template = []
+        size = 0
+        ordered = list(self._priority) + [tx_id for tx_id in self._txs if tx_id not in self._priority]
+        for tx_id in ordered:
+            if len(template) >= max_count or size + self._sizes[tx_id] > max_bytes:
+                break
+            template.append((tx_id, self._txs[tx_id]))
+            size += self._sizes[tx_id]
+        return template
+
+    def clear(self):
+        self._txs.clear()
+        self._sizes.clear()
+        self._priority.clear()
+        self._by_sender.clear()
+        self._reports.clear()
+        self.total_bytes = 0
@@ -0,0 +1,69 @@
+import hashlib
+import json
+
+# Префиксы разделяют хеши листьев и внутренних узлов: внутренний узел нельзя
+# выдать за транзакцию и наоборот
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+EMPTY_ROOT = hashlib.sha256(b'').hexdigest()
+
+
+def leaf_hash(tx):
+    return hashlib.sha256(LEAF_PREFIX + json.dumps(tx, sort_keys=True).encode()).digest()
+
+
+def _node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level):
+    # Непарный последний узел переносится на уровень выше без изменений (не дублируется)
+    parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(transactions):
+    """Корень дерева Меркла над транзакциями блока (hex)."""
+    if not transactions:
+        return EMPTY_ROOT
+    level = [leaf_hash(tx) for tx in transactions]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(transactions, position):
+    """Путь включения транзакции с номером position: [{'hash', 'side'}] от листа к корню.
+
+    side - с какой стороны от текущего узла стоит соседний хеш ('left' или 'right').
+    """
+    if not 0 <= position < len(transactions):
+        raise IndexError("Транзакции с таким номером в блоке нет")
+    level = [leaf_hash(tx) for tx in transactions]
+    path = []
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            path.append({'hash': level[sibling].hex(), 'side': 'left' if sibling < position else 'right'})
+        level = _next_level(level)
+        position //= 2
+    return path
+
+
+def verify_merkle_proof(tx, proof, root):
+    """Проверяет, что транзакция tx входит в блок с корнем root, по пути из merkle_proof."""
+    current = leaf_hash(tx)
+    try:
+        for step in proof:
+            sibling = bytes.fromhex(step['hash'])
+            if step['side'] == 'left':
+                current = _node_hash(sibling, current)
+            elif step['side'] == 'right':
+                current = _node_hash(current, sibling)
+            else:
+                return False
+    except (KeyError, TypeError, ValueError):
+        return False
+    return current.hex() == root
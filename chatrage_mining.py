@@ -0,0 +1,233 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from uuid import uuid4
+
+from chatrage_logging import get_logger
+
+# Число ведущих нулей в hex-дайджесте, как в ChatRageBlockchain.valid_proof
+DIFFICULTY = 4
+CHUNK_SIZE = 50000
+
+log = get_logger('mining')
+
+
+def search_range(last_proof, start, stop, difficulty=DIFFICULTY):
+    """Ищет proof в диапазоне [start, stop).
+
+    Префикс last_proof хешируется один раз и копируется через .copy(), а
+    сравнивается сырой дайджест, без перевода в hex-строку.
+    Возвращает (proof или None, число проверенных nonce).
+    """
+    prefix = hashlib.sha256(str(last_proof).encode())
+    zero_bytes = bytes(difficulty // 2)
+    full = len(zero_bytes)
+    odd_nibble = difficulty % 2
+    for proof in range(start, stop):
+        h = prefix.copy()
+        h.update(b'%d' % proof)
+        digest = h.digest()
+        if digest[:full] == zero_bytes and (not odd_nibble or digest[full] < 16):
+            return proof, proof - start + 1
+    return None, stop - start
+
+
+class MiningResult:
+    def __init__(self, proof, hashes, elapsed):
+        self.proof = proof
+        self.hashes = hashes
+        self.elapsed = elapsed
+
+    @property
+    def cancelled(self):
+        return self.proof is None
+
+    @property
+    def hashrate(self):
+        return self.hashes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'proof': self.proof,
+            'hashes': self.hashes,
+            'elapsed': self.elapsed,
+            'hashrate': self.hashrate
+        }
+
+
+class TightLoopMiner:
+    """Однопоточный майнер: перебирает nonce по порядку в текущем процессе."""
+
+    name = 'tight'
+
+    def __init__(self, difficulty=DIFFICULTY, chunk_size=CHUNK_SIZE):
+        self.difficulty = difficulty
+        self.chunk_size = chunk_size
+
+    def mine(self, last_proof, should_stop=None):
+        started = time.perf_counter()
+        hashes = 0
+        start = 0
+        while True:
+            # Отмену проверяем между порциями, чтобы не замедлять внутренний цикл
+            if should_stop is not None and should_stop():
+                return MiningResult(None, hashes, time.perf_counter() - started)
+            proof, checked = search_range(last_proof, start, start + self.chunk_size, self.difficulty)
+            hashes += checked
+            if proof is not None:
+                return MiningResult(proof, hashes, time.perf_counter() - started)
+            start += self.chunk_size
+
+    def close(self):
+        pass
+
+
+class ProcessPoolMiner:
+    """Многопроцессный майнер: пространство nonce делится на порции между процессами."""
+
+    name = 'process'
+
+    def __init__(self, workers=None, difficulty=DIFFICULTY, chunk_size=CHUNK_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.difficulty = difficulty
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    def start(self):
+        """Создает пул и сразу запускает все его процессы.
+
+        fork не переимпортирует главный модуль узла в дочерних процессах, но
+        копирует процесс вместе с блокировками, захваченными другими потоками.
+        Поэтому пул нужно запускать до того, как узел запустит свои потоки
+        (логирование, сервер, gossip): с fork ProcessPoolExecutor порождает все
+        процессы при первой задаче и больше не создает новых.
+        """
+        if self._executor is not None:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        if context.get_start_method() == 'fork' and threading.active_count() > 1:
+            log.warning("Пул майнинга запускается при работающих потоках (%d): fork может унаследовать "
+                        "захваченные ими блокировки", threading.active_count() - 1)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._executor.submit(int).result()
+
+    def _get_executor(self):
+        self.start()
+        return self._executor
+
+    def mine(self, last_proof, should_stop=None):
+        executor = self._get_executor()
+        started = time.perf_counter()
+        hashes = 0
+        next_start = 0
+        in_flight = set()
+        found = None
+        try:
+            while found is None:
+                if should_stop is not None and should_stop():
+                    break
+                # Держим по две порции на процесс, чтобы процессы не простаивали
+                while len(in_flight) < self.workers * 2:
+                    in_flight.add(executor.submit(search_range, last_proof, next_start,
+                                                  next_start + self.chunk_size, self.difficulty))
+                    next_start += self.chunk_size
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    proof, checked = future.result()
+                    hashes += checked
+                    if proof is not None and (found is None or proof < found):
+                        found = proof
+        finally:
+            for future in in_flight:
+                future.cancel()
+        return MiningResult(found, hashes, time.perf_counter() - started)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_miner(workers=0):
+    """workers=0 - майнинг в текущем процессе, иначе пул из workers процессов, запущенный сразу."""
+    if workers:
+        miner = ProcessPoolMiner(workers)
+        miner.start()
+        return miner
+    return TightLoopMiner()
+
+
+class MiningJob:
+    def __init__(self):
+        self.id = uuid4().hex
+        self.status = 'queued'
+        self.created = time.time()
+        self.finished = None
+        self.block = None
+        self.mining = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'block': self.block,
+            'mining': self.mining,
+            'error': self.error
+        }
+
+
+class MiningJobManager:
+    """Запускает майнинг в фоновом потоке; одновременно выполняется не больше одного задания.
+
+    mine_func возвращает (блок, MiningResult); блок равен None, если майнинг
+    был отменен из-за смены вершины цепочки.
+    """
+
+    def __init__(self, mine_func, max_finished_jobs=100):
+        self.mine_func = mine_func
+        self.max_finished_jobs = max_finished_jobs
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = None
+
+    def submit(self):
+        with self._lock:
+            if self._active is not None:
+                return self._active
+            job = MiningJob()
+            self._jobs[job.id] = job
+            self._active = job
+            while len(self._jobs) > self.max_finished_jobs + 1:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        try:
+            block, result = self.mine_func()
+            job.mining = result.to_dict()
+            if block is None:
+                job.status = 'cancelled'
+            else:
+                job.block = block
+                job.status = 'done'
+        except Exception as e:
+            log.exception("Задание майнинга %s завершилось ошибкой", job.id)
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished = time.time()
+        with self._lock:
+            self._active = None
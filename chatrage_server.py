@@ -0,0 +1,300 @@
+"""Рабочий HTTP-сервер узла ChatRage.
+
+Узел хранит цепочку, пул транзакций и журнал блоков в памяти одного процесса,
+и этот процесс - единственный, кто их изменяет. Поэтому сервер масштабируется
+потоками, а не процессами: запросы обслуживает пул из workers потоков, а
+соединения HTTP/1.1 остаются открытыми (keep-alive) между запросами.
+
+Простаивающее соединение не занимает поток пула: между запросами его сокет
+ждет в селекторе отдельного потока и передается в пул, только когда от
+клиента пришли данные. Поэтому открытые соединения соседей (их PeerClient
+держит до 16 на узел) не отнимают потоки у запросов.
+
+Запуск:
+
+    python chatrage_coin.py -p 5000 --workers 16
+    python chatrage_coin.py -p 5000 --debug   # dev-сервер Flask с перезагрузкой
+
+С внешним WSGI-сервером приложение - chatrage_coin:app, но только в одном
+процессе, например: gunicorn -w 1 --threads 16 chatrage_coin:app. Несколько
+процессов означали бы несколько независимых узлов с общим каталогом данных.
+"""
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import InternalServerError
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import LimitedStream
+
+from chatrage_logging import get_logger
+
+DEFAULT_WORKERS = 16
+# Сколько секунд держать простаивающее keep-alive соединение открытым
+KEEPALIVE_TIMEOUT = 5.0
+# Непрочитанное приложением тело запроса больше этого размера не дочитываем, а закрываем соединение
+MAX_DRAIN_BYTES = 1024 * 1024
+
+log = get_logger('api')
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """Обработчик с поддержкой keep-alive.
+
+    Обработчик werkzeug закрывает соединение после каждого ответа. Здесь
+    окружение WSGI строится так же (make_environ), но тело запроса ограничено
+    Content-Length и дочитывается после ответа, а ответ без Content-Length
+    передается по частям (chunked), так что соединение можно использовать снова.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        # Заголовки и тело уходят отдельными записями: без TCP_NODELAY второй записи
+        # пришлось бы ждать подтверждения первой (алгоритм Нейгла и отложенный ACK)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def run_wsgi(self):
+        if self.headers.get('Expect', '').lower().strip(' \t') == '100-continue':
+            self.wfile.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        self.environ = environ = self.make_environ()
+        # Тело в chunked-кодировке werkzeug уже обернул в DechunkedInput; его границы
+        # после ответа не восстановить, поэтому такое соединение закрываем
+        body = None
+        if not environ.get('wsgi.input_terminated'):
+            body = LimitedStream(self.rfile, int(environ.get('CONTENT_LENGTH') or 0))
+            environ['wsgi.input'] = body
+        keep_alive = body is not None and not self.close_connection and self.request_version == 'HTTP/1.1'
+
+        response = {'status': None, 'headers': None, 'sent': False, 'chunked': False}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response['sent']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = status
+            response['headers'] = headers
+            return write
+
+        def write(data):
+            if not response['sent']:
+                code, _, message = response['status'].partition(' ')
+                code = int(code)
+                self.send_response(code, message)
+                header_keys = set()
+                for key, value in response['headers']:
+                    self.send_header(key, value)
+                    header_keys.add(key.lower())
+                has_body = not (environ['REQUEST_METHOD'] == 'HEAD' or 100 <= code < 200 or code in (204, 304))
+                if has_body and 'content-length' not in header_keys:
+                    if keep_alive:
+                        response['chunked'] = True
+                        self.send_header('Transfer-Encoding', 'chunked')
+                    else:
+                        self.close_connection = True
+                if not keep_alive or self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                response['sent'] = True
+            if data:
+                if response['chunked']:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                else:
+                    self.wfile.write(data)
+
+        def execute(application):
+            application_iter = application(environ, start_response)
+            try:
+                for data in application_iter:
+                    write(data)
+                if not response['sent']:
+                    write(b'')
+                if response['chunked']:
+                    self.wfile.write(b'0\r\n\r\n')
+            finally:
+                if hasattr(application_iter, 'close'):
+                    application_iter.close()
+
+        try:
+            execute(self.server.app)
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e, environ)
+            self.close_connection = True
+            return
+        except Exception:
+            log.exception('Ошибка при обработке запроса %s', self.requestline)
+            if response['sent']:
+                # Часть ответа уже отправлена: клиент узнает об ошибке по обрыву соединения
+                self.close_connection = True
+                return
+            keep_alive = False
+            response['status'] = None
+            execute(InternalServerError())
+
+        if not keep_alive:
+            self.close_connection = True
+        elif not self.close_connection:
+            # Следующий запрос начинается сразу после тела текущего
+            if body.limit - body.tell() > MAX_DRAIN_BYTES:
+                self.close_connection = True
+            else:
+                body.exhaust()
+
+    def has_buffered_request(self):
+        """Пришло ли уже начало следующего запроса (например, при конвейерной отправке).
+
+        Данные могут лежать в буфере rfile, где селектор их не увидит. Сокет на
+        время проверки неблокирующий: если данных нет, peek сразу вернет b''.
+        """
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def log_request(self, code='-', size='-'):
+        log.debug('%s "%s" %s %s', self.address_string(), self.requestline, code, size)
+
+    def log_error(self, format, *args):
+        # Истекший таймаут простаивающего keep-alive соединения - штатная ситуация
+        level = logging.DEBUG if format.startswith('Request timed out') else logging.WARNING
+        log.log(level, '%s %s', self.address_string(), format % args)
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """WSGI-сервер, обслуживающий запросы фиксированным пулом потоков.
+
+    Поток пула обрабатывает запрос (и уже пришедшие следом за ним), после чего
+    возвращает соединение в селектор простаивающих. Селектор закрывает
+    соединения, простоявшие дольше keepalive_timeout.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, workers=DEFAULT_WORKERS, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        handler = type('RequestHandler', (KeepAliveRequestHandler,), {'timeout': keepalive_timeout})
+        self.workers = workers
+        self.keepalive_timeout = keepalive_timeout
+        # Все, что закрывает server_close, создаем до super().__init__(): если порт занят,
+        # werkzeug вызывает server_close прямо из конструктора
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+        self._selector = selectors.DefaultSelector()
+        self._idle_since = {}
+        # Регистрирует соединения в селекторе только его поток: сюда их кладут потоки пула
+        self._parked = deque()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._closing = False
+        self._idle_thread = None
+        super().__init__(host, port, app, handler=handler)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='http-idle', daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        # Новое соединение тоже ждет первого запроса в селекторе, а не в потоке пула
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = request
+        handler.client_address = client_address
+        handler.server = self
+        try:
+            handler.setup()
+        except OSError:
+            self.shutdown_request(request)
+            return
+        self._park(handler)
+
+    def _park(self, handler):
+        self._parked.append(handler)
+        self._wake_selector()
+
+    def _wake_selector(self):
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def _watch_idle(self):
+        while not self._closing:
+            for key, _ in self._selector.select(timeout=min(self.keepalive_timeout, 1.0)):
+                if key.fileobj is self._wakeup_reader:
+                    try:
+                        while self._wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                handler = key.data
+                self._selector.unregister(handler.connection)
+                del self._idle_since[handler]
+                self.executor.submit(self._serve_connection, handler)
+            while self._parked:
+                handler = self._parked.popleft()
+                self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+                self._idle_since[handler] = time.monotonic()
+            expired_before = time.monotonic() - self.keepalive_timeout
+            for handler, since in list(self._idle_since.items()):
+                if since < expired_before:
+                    self._selector.unregister(handler.connection)
+                    del self._idle_since[handler]
+                    self._close_connection(handler)
+
+    def _serve_connection(self, handler):
+        try:
+            while True:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection or not handler.has_buffered_request():
+                    break
+        except (ConnectionError, socket.timeout) as e:
+            handler.connection_dropped(e)
+            handler.close_connection = True
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+        if handler.close_connection or self._closing:
+            self._close_connection(handler)
+        else:
+            self._park(handler)
+
+    def _close_connection(self, handler):
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def server_close(self):
+        self._closing = True
+        self._wake_selector()
+        if self._idle_thread is not None:
+            self._idle_thread.join(timeout=2.0)
+        for handler in list(self._idle_since) + list(self._parked):
+            self._close_connection(handler)
+        self._idle_since.clear()
+        self._parked.clear()
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+
+def serve(app, host='0.0.0.0', port=5000, workers=DEFAULT_WORKERS, keepalive_timeout=KEEPALIVE_TIMEOUT):
+    """Обслуживает app до прерывания (Ctrl+C)."""
+    server = ThreadPoolWSGIServer(host, port, app, workers, keepalive_timeout)
+    log.info("Узел слушает http://%s:%s (потоков: %d)", host, port, workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+import zlib
+
+from chatrage_codec import DEFAULT_CODEC, decode_record, encode_record, intern_block
+
+# Заголовок записи: длина полезной нагрузки и ее CRC32
+RECORD_HEADER = struct.Struct('>II')
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+FSYNC_EVERY = 16
+FSYNC_INTERVAL = 1.0
+
+
+def write_json_atomic(path, data):
+    """Атомарно записывает JSON: сначала во временный файл, затем os.replace."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    """Читает JSON-файл. Возвращает None, если файла нет или он поврежден."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def _checkpoint_digest(body, key=None):
+    payload = json.dumps(body, sort_keys=True).encode()
+    if key:
+        return hmac.new(key.encode(), payload, hashlib.sha256).hexdigest()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def write_checkpoint(path, height, block_hash, state, key=None):
+    """Сохраняет чекпоинт состояния на блоке height, подписанный HMAC (если задан key) или хешем."""
+    body = {'height': height, 'block_hash': block_hash, 'state': state}
+    write_json_atomic(path, dict(body, digest=_checkpoint_digest(body, key)))
+
+
+def read_checkpoint(path, key=None):
+    """Читает чекпоинт состояния. Возвращает None, если его нет или подпись не сходится."""
+    data = read_json(path)
+    if not data or 'digest' not in data:
+        return None
+    digest = data.pop('digest')
+    if not hmac.compare_digest(digest, _checkpoint_digest(data, key)):
+        return None
+    return data
+
+
+class BlockLog:
+    """Сегментированный журнал блоков: одна запись (длина, CRC32, блок) на блок.
+
+    Запись только дописывается в конец, поэтому стоимость сохранения блока не
+    зависит от длины цепочки. Оборванная запись в хвосте отбрасывается при
+    чтении, не затрагивая предыдущие блоки. Блок записывается в формате codec
+    ('json' или 'msgpack'); читаются записи обоих форматов вперемешку.
+    """
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL, codec=DEFAULT_CODEC):
+        self.directory = directory
+        self.codec = codec
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        # (номер сегмента, смещение) для каждой записи журнала
+        self._positions = []
+        self._file = None
+        self._segment = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"segment_{segment:06d}.log")
+
+    def _segments_on_disk(self):
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('segment_') and name.endswith('.log'):
+                segments.append(int(name[len('segment_'):-len('.log')]))
+        return sorted(segments)
+
+    def read_all(self):
+        """Читает все целые записи. Поврежденный хвост обрезается.
+
+        Возвращает (блоки, хеши): хеш JSON-записи считается по ней самой (это
+        каноническая сериализация блока), хеш msgpack-записи хранится в ней и
+        с содержимым не сверяется - это делает загрузка цепочки для блоков после чекпоинта.
+        """
+        self.close()
+        self._positions = []
+        blocks = []
+        hashes = []
+        segments = self._segments_on_disk()
+        for i, segment in enumerate(segments):
+            path = self._segment_path(segment)
+            with open(path, 'rb') as f:
+                data = f.read()
+            offset = 0
+            torn = False
+            while offset < len(data):
+                header_end = offset + RECORD_HEADER.size
+                if header_end > len(data):
+                    torn = True
+                    break
+                length, crc = RECORD_HEADER.unpack_from(data, offset)
+                payload = data[header_end:header_end + length]
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    torn = True
+                    break
+                try:
+                    block, block_hash = decode_record(payload)
+                except ValueError:
+                    torn = True
+                    break
+                blocks.append(intern_block(block))
+                hashes.append(block_hash)
+                self._positions.append((segment, offset))
+                offset = header_end + length
+            if torn:
+                # Все, что после поврежденной записи, недостоверно
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+                for later in segments[i + 1:]:
+                    os.remove(self._segment_path(later))
+                break
+        self._segment = self._positions[-1][0] if self._positions else (segments[0] if segments else 0)
+        return blocks, hashes
+
+    def _open_for_append(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self._segment_path(self._segment), 'ab')
+
+    def append(self, block, payload=None, block_hash=None):
+        """payload - каноническая JSON-сериализация блока, block_hash - его хеш, если уже известны."""
+        payload = encode_record(block, self.codec, payload, block_hash)
+        if self._file is None:
+            self._open_for_append()
+        if self._file.tell() >= self.segment_max_bytes:
+            self._roll_segment()
+        self._positions.append((self._segment, self._file.tell()))
+        self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self.sync()
+
+    def _roll_segment(self):
+        self.sync()
+        self._file.close()
+        self._segment += 1
+        self._open_for_append()
+
+    def sync(self):
+        """Сбрасывает накопленные записи на диск (fsync)."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def truncate(self, height):
+        """Оставляет в журнале только первые height записей."""
+        if height >= len(self._positions):
+            return
+        self.close()
+        segment, offset = self._positions[height]
+        with open(self._segment_path(segment), 'r+b') as f:
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        for later in self._segments_on_disk():
+            if later > segment:
+                os.remove(self._segment_path(later))
+        self._positions = self._positions[:height]
+        self._segment = segment
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,261 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from chatrage_codec import MSGPACK_MIMETYPE, loads_msgpack, msgpack_available
+from chatrage_compression import PEER_ACCEPT_ENCODING
+from chatrage_logging import get_logger
+
+# Размер страницы при загрузке недостающих блоков у соседа
+SYNC_PAGE_SIZE = 500
+# Таймаут одного запроса к соседу и общий срок на разрешение конфликтов, в секундах
+PEER_TIMEOUT = 3.0
+RESOLVE_DEADLINE = 15.0
+MAX_PARALLEL_PEERS = 16
+# Вес нового замера в скользящем среднем задержки соседа
+LATENCY_EWMA_ALPHA = 0.3
+# После стольких ошибок подряд сосед считается недоступным (dead)
+PEER_MAX_FAILURES = 5
+# Недоступного соседа не удаляем, а изредка проверяем снова: он мог просто перезапускаться
+PEER_DEAD_RETRY = 60.0
+# ...но сосед, не отвечающий дольше этого (в секундах), удаляется из таблицы
+PEER_EVICT_AFTER = 6 * 3600.0
+# Отсрочка после ошибки удваивается с каждой следующей: 1, 2, 4... секунд, но не больше PEER_BACKOFF_MAX
+PEER_BACKOFF_BASE = 1.0
+PEER_BACKOFF_MAX = 60.0
+
+log = get_logger('sync')
+
+
+def block_locator(block_hashes):
+    """Локатор цепочки: пары [индекс, хеш] для вершины и экспоненциально редеющих блоков до генезиса."""
+    locator = []
+    position = len(block_hashes) - 1
+    step = 1
+    while position > 0:
+        locator.append([position + 1, block_hashes[position]])
+        if len(locator) >= 10:
+            step *= 2
+        position -= step
+    if block_hashes:
+        locator.append([1, block_hashes[0]])
+    return locator
+
+
+class PeerTable:
+    """Таблица соседних узлов с их состоянием.
+
+    Для каждого соседа хранится задержка (скользящее среднее), число ошибок
+    подряд, последняя известная длина его цепочки и время, до которого он в
+    отсрочке после ошибки. Соседи в отсрочке не опрашиваются. После
+    max_failures ошибок подряд сосед помечается недоступным (dead) и
+    проверяется раз в dead_retry секунд; первый успешный запрос к нему,
+    его объявление или повторная регистрация возвращают его в строй.
+    Недоступный сосед, от которого ничего не было дольше evict_after секунд
+    (с последнего ответа или с добавления), удаляется.
+    """
+
+    def __init__(self, max_failures=PEER_MAX_FAILURES, backoff_base=PEER_BACKOFF_BASE,
+                 backoff_max=PEER_BACKOFF_MAX, dead_retry=PEER_DEAD_RETRY, evict_after=PEER_EVICT_AFTER,
+                 latency_alpha=LATENCY_EWMA_ALPHA):
+        self.max_failures = max_failures
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_retry = dead_retry
+        self.evict_after = evict_after
+        self.latency_alpha = latency_alpha
+        self._peers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, node):
+        return node in self._peers
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._peers))
+
+    def add(self, node):
+        """Добавляет соседа. Возвращает False, если он уже есть в таблице (тогда отсрочка сбрасывается)."""
+        with self._lock:
+            if node in self._peers:
+                self._revive(self._peers[node])
+                return False
+            self._peers[node] = {
+                'requests': 0,
+                'failures': 0,
+                'consecutive_failures': 0,
+                'latency': None,
+                'last_latency': None,
+                'max_latency': 0.0,
+                'tip_height': None,
+                'last_seen': None,
+                'added': time.time(),
+                'backoff_until': 0.0,
+                'dead': False
+            }
+            return True
+
+    @staticmethod
+    def _revive(peer):
+        peer['consecutive_failures'] = 0
+        peer['backoff_until'] = 0.0
+        peer['dead'] = False
+
+    def discard(self, node):
+        with self._lock:
+            self._peers.pop(node, None)
+
+    def record(self, node, latency, ok):
+        """Учитывает результат запроса к соседу. Запросы к узлам не из таблицы не учитываются."""
+        with self._lock:
+            peer = self._peers.get(node)
+            if peer is None:
+                return
+            peer['requests'] += 1
+            revived = died = evicted = False
+            if ok:
+                revived = peer['dead']
+                self._revive(peer)
+                peer['last_seen'] = time.time()
+                peer['last_latency'] = latency
+                peer['max_latency'] = max(peer['max_latency'], latency)
+                previous = peer['latency']
+                peer['latency'] = latency if previous is None else previous + self.latency_alpha * (latency - previous)
+            else:
+                peer['failures'] += 1
+                peer['consecutive_failures'] += 1
+                if peer['consecutive_failures'] >= self.max_failures:
+                    died = not peer['dead']
+                    peer['dead'] = True
+                    backoff = self.dead_retry
+                    evicted = time.time() - (peer['last_seen'] or peer['added']) >= self.evict_after
+                else:
+                    backoff = min(self.backoff_base * 2 ** (peer['consecutive_failures'] - 1), self.backoff_max)
+                peer['backoff_until'] = time.monotonic() + backoff
+                if evicted:
+                    del self._peers[node]
+        if revived:
+            log.info("Узел %s снова доступен.", node)
+        elif evicted:
+            log.warning("Узел %s не отвечает дольше %.0f ч и удален из списка соседей.",
+                        node, self.evict_after / 3600)
+        elif died:
+            log.warning("Узел %s недоступен после %d ошибок подряд; повторная проверка раз в %.0f с.",
+                        node, self.max_failures, self.dead_retry)
+
+    def record_tip(self, node, height):
+        with self._lock:
+            peer = self._peers.get(node)
+            if peer is not None:
+                # Сосед сам прислал вершину, значит, он работает
+                self._revive(peer)
+                peer['tip_height'] = height
+                peer['last_seen'] = time.time()
+
+    def ranked(self):
+        """Соседи не в отсрочке: сначала с самой длинной цепочкой, среди них - самые быстрые."""
+        now = time.monotonic()
+        with self._lock:
+            available = [(node, peer) for node, peer in self._peers.items() if peer['backoff_until'] <= now]
+        available.sort(key=lambda item: (-(item[1]['tip_height'] or 0),
+                                         item[1]['latency'] if item[1]['latency'] is not None else float('inf')))
+        return [node for node, _ in available]
+
+    def get_stats(self):
+        """Снимок таблицы: {сосед: состояние}; backoff - сколько секунд осталось до конца отсрочки."""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for node, peer in self._peers.items():
+                peer = dict(peer)
+                peer['backoff'] = max(peer.pop('backoff_until') - now, 0.0)
+                stats[node] = peer
+            return stats
+
+
+class PeerClient:
+    """HTTP-клиент для опроса соседей: общий пул соединений, параллельные запросы
+    и учет задержек и ошибок каждого соседа в таблице peers."""
+
+    def __init__(self, timeout=PEER_TIMEOUT, max_workers=MAX_PARALLEL_PEERS, peers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        # Страницы блоков сжимаются в несколько раз; ответ распаковывает urllib3
+        self.session.headers['Accept-Encoding'] = PEER_ACCEPT_ENCODING
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='peer')
+        self.peers = peers if peers is not None else PeerTable()
+
+    def _record(self, node, latency, ok):
+        self.peers.record(node, latency, ok)
+
+    def get_stats(self):
+        return self.peers.get_stats()
+
+    def _request(self, method, node, path, deadline=None, **kwargs):
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.monotonic(), 0.001))
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'http://{node}{path}', timeout=timeout, **kwargs)
+            response.raise_for_status()
+            if response.headers.get('Content-Type', '').startswith(MSGPACK_MIMETYPE):
+                data = loads_msgpack(response.content)
+            else:
+                data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._record(node, time.perf_counter() - started, ok=False)
+            log.debug("Запрос %s %s к %s не удался: %s", method, path, node, e)
+            raise
+        self._record(node, time.perf_counter() - started, ok=True)
+        return data
+
+    def fetch_tip(self, node, deadline=None):
+        tip = self._request('GET', node, '/chain/tip', deadline)
+        self.peers.record_tip(node, tip['length'])
+        return tip
+
+    def fetch_tips(self, nodes, deadline=None):
+        """Параллельно запрашивает вершины цепочек. Узлы, не ответившие к сроку, пропускаются."""
+        futures = {self.executor.submit(self.fetch_tip, node, deadline): node for node in nodes}
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, _ = wait(futures, timeout=timeout)
+        tips = {}
+        for future in done:
+            if future.exception() is None:
+                tips[futures[future]] = future.result()
+        return tips
+
+    def locate_fork_point(self, node, locator, deadline=None):
+        """Спрашивает у соседа, до какого блока его цепочка совпадает с нашей."""
+        return self._request('POST', node, '/chain/locate', deadline, json={'locator': locator})['height']
+
+    def fetch_blocks(self, node, from_index, to_index, deadline=None, page_size=SYNC_PAGE_SIZE):
+        """Загружает блоки с индексами from_index..to_index включительно постранично."""
+        blocks = []
+        # Страницы блоков - самые большие ответы: просим msgpack, если он есть у обеих сторон
+        headers = {'Accept': f'{MSGPACK_MIMETYPE}, application/json;q=0.9'} if msgpack_available() else None
+        while from_index + len(blocks) <= to_index:
+            start = from_index + len(blocks)
+            params = {'from': start, 'limit': min(page_size, to_index - start + 1)}
+            page = self._request('GET', node, '/chain', deadline, params=params, headers=headers)['chain']
+            if not page:
+                break
+            blocks.extend(page)
+        return blocks
+
+    def fetch_transactions(self, node, tx_ids, deadline=None):
+        """Запрашивает у соседа транзакции по id. Неизвестные соседу id он пропускает."""
+        return self._request('POST', node, '/transactions/get', deadline, json={'tx_ids': tx_ids})['transactions']
+
+    def announce(self, node, announcement, deadline=None):
+        """Отправляет соседу объявление о новых транзакциях и блоках (см. chatrage_gossip)."""
+        return self._request('POST', node, '/gossip/announce', deadline, json=announcement)
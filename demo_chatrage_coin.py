@@ -39,7 +39,12 @@ def send_post_request(url, payload):
 
 def mine_block_on_node(node_url):
     print(f"\n[DEMO] Майним блок на {node_url}...")
-    return send_get_request(f"{node_url}/mine")
+    job = send_get_request(f"{node_url}/mine")
+    # Майнинг идет в фоне: ждем завершения задания
+    while job and job['status'] in ('queued', 'running'):
+        time.sleep(0.5)
+        job = send_get_request(f"{node_url}/mine/{job['job_id']}")
+    return job
 
 
 def get_balance_on_node(node_url, address):
@@ -118,7 +123,7 @@ def run_demo():
 
     # Шаг 1: Подготовка узлов и получение начальных RAGE
     print("\n[ШАГ 1] Подготовка: Майним несколько блоков на Узле 1 и получаем ID узлов.")
-    node_1_id = send_get_request(f"{NODE_URLS[0]}/mine")['transactions'][0][
+    node_1_id = mine_block_on_node(NODE_URLS[0])['transactions'][0][
         'recipient']  # Майнинг дает награду узлу, берем его ID
     mine_block_on_node(NODE_URLS[0])
     mine_block_on_node(NODE_URLS[0])
@@ -165,9 +170,9 @@ def run_demo():
     resolve_conflicts_on_node(NODE_URLS[1])  # Узел 2 синхронизируется с Узлом 1
 
     # Проверяем, что цепочки совпадают
-    chain_node1 = send_get_request(f"{NODE_URLS[0]}/chain")
-    chain_node2 = send_get_request(f"{NODE_URLS[1]}/chain")
-    if chain_node1 and chain_node2 and len(chain_node1['chain']) == len(chain_node2['chain']):
+    tip_node1 = send_get_request(f"{NODE_URLS[0]}/chain/tip")
+    tip_node2 = send_get_request(f"{NODE_URLS[1]}/chain/tip")
+    if tip_node1 and tip_node2 and tip_node1['hash'] == tip_node2['hash']:
         print("[DEMO] Узлы синхронизированы успешно!")
     else:
         print("[DEMO] Ошибка синхронизации узлов.")
@@ -0,0 +1,304 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from chatrage_mining import MiningResult, TightLoopMiner
+from chatrage_storage import read_json
+
+CHECKPOINT_INTERVAL = 3
+# Proof зависит только от предыдущего proof, а цепочки в тестах начинаются с одного генезиса:
+# найденные proof запоминаются на весь прогон
+_PROOFS = {}
+
+
+class CachedMiner:
+    name = 'cached'
+
+    def __init__(self):
+        self._miner = TightLoopMiner()
+
+    def mine(self, last_proof, should_stop=None):
+        if last_proof not in _PROOFS:
+            _PROOFS[last_proof] = self._miner.mine(last_proof).proof
+        return MiningResult(_PROOFS[last_proof], 0, 0.0)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def coin(tmp_path, monkeypatch):
+    # Модуль узла при импорте создает свой узел в blockchain_data текущего каталога
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('CHATRAGE_NODE_ID', 'module')
+    import chatrage_coin
+    monkeypatch.setattr(chatrage_coin, 'CHECKPOINT_INTERVAL', CHECKPOINT_INTERVAL)
+    return chatrage_coin
+
+
+@pytest.fixture
+def make_node(coin):
+    """Создает узел в каталоге теста; журналы всех созданных узлов закрываются после теста."""
+    created = []
+
+    def make(node_id='node', **kwargs):
+        node = coin.ChatRageBlockchain(node_id, miner=CachedMiner(), **kwargs)
+        created.append(node)
+        return node
+
+    yield make
+    for node in created:
+        node.flush_checkpoint()
+        node.block_log.close()
+
+
+def mine(node, count=1, reward_address='miner'):
+    for _ in range(count):
+        block, _ = node.mine_block(reward_address)
+        assert block is not None
+
+
+def populate(node):
+    """Цепочка из 5 блоков с переводами, стейками, решенным и нерешенным репортами."""
+    mine(node, reward_address='alice')
+    node.new_transaction('alice', 'bob', 3, 'transfer', data={'nonce': 'a'})
+    node.new_transaction('alice', 'staking_pool', 2, 'stake', data={'nonce': 'b'})
+    node.submit_rage_report('alice', 'spam content', 'spam', stake_amount=1)
+    node.submit_rage_report('bob', 'other content', 'abuse')
+    mine(node)
+    decided, pending = sorted(node.pending_rage_reports, key=lambda report_id: (
+        node.pending_rage_reports[report_id]['report_data']['reporter_address']), reverse=True)
+    node.vote_on_rage_report('carol', decided, 'approve')
+    node.vote_on_rage_report('dave', decided, 'approve')
+    node.vote_on_rage_report('carol', pending, 'reject')
+    mine(node)
+    node.new_transaction('bob', 'carol', 1, 'transfer', data={'nonce': 'c'})
+    mine(node)
+    assert len(node.chain) == 5
+    assert list(node.pending_rage_reports) == [pending]
+
+
+def state_of(node):
+    addresses = ('alice', 'bob', 'carol', 'miner', 'Rage_Protocol_Reward')
+    return {
+        'staked_balances': node.staked_balances,
+        'pending_rage_reports': node.pending_rage_reports,
+        'balances': node.balance_ledger.balances,
+        'history': [[node.get_balance(address, height) for address in addresses]
+                    for height in range(1, len(node.chain) + 1)],
+        'rage_counts': node.rage_index.counts,
+        'rage_reasons': node.rage_index.reasons,
+        'tx_locations': node.tx_index.transactions,
+        'report_locations': node.tx_index.reports,
+    }
+
+
+def test_restart_from_checkpoint_matches_full_replay(make_node):
+    node = make_node()
+    populate(node)
+    expected = state_of(node)
+    node.flush_checkpoint()
+    node.block_log.close()
+
+    restarted = make_node()
+    # Состояние взято из чекпоинта, после него переиграны только последние блоки
+    assert restarted.checkpoint_height == CHECKPOINT_INTERVAL < len(restarted.chain)
+    assert state_of(restarted) == expected
+    restarted.block_log.close()
+
+    verified = make_node(full_verify=True)
+    assert state_of(verified) == expected
+
+
+def forge_checkpoint(coin, node, **changes):
+    """Чекпоинт с измененными балансами, подписанный заново: отличить подделку можно только по хешу блока."""
+    checkpoint = coin.read_checkpoint(node.checkpoint_file_path, coin.CHECKPOINT_KEY)
+    state = dict(checkpoint['state'], balances={'alice': 10 ** 6})
+    coin.write_checkpoint(node.checkpoint_file_path, checkpoint['height'],
+                          changes.get('block_hash', checkpoint['block_hash']), state, coin.CHECKPOINT_KEY)
+
+
+def test_checkpoint_with_foreign_block_hash_is_ignored(coin, make_node):
+    node = make_node()
+    populate(node)
+    expected = state_of(node)
+    node.flush_checkpoint()
+    node.block_log.close()
+    forge_checkpoint(coin, node, block_hash='0' * 64)
+
+    restarted = make_node()
+    assert restarted.checkpoint_height == 0
+    assert state_of(restarted) == expected
+
+
+def test_checkpoint_with_wrong_digest_is_ignored(coin, make_node):
+    node = make_node()
+    populate(node)
+    expected = state_of(node)
+    node.flush_checkpoint()
+    node.block_log.close()
+    checkpoint = read_json(node.checkpoint_file_path)
+    checkpoint['state']['balances'] = {'alice': 10 ** 6}
+    with open(node.checkpoint_file_path, 'w') as f:
+        json.dump(checkpoint, f)
+
+    restarted = make_node()
+    assert restarted.checkpoint_height == 0
+    assert state_of(restarted) == expected
+
+
+def test_forged_checkpoint_is_used_when_it_matches_the_chain(coin, make_node):
+    # Проверка самих тестов: подделка с верным хешем блока действительно загружается
+    node = make_node()
+    populate(node)
+    node.flush_checkpoint()
+    node.block_log.close()
+    forge_checkpoint(coin, node)
+
+    restarted = make_node()
+    assert restarted.checkpoint_height == CHECKPOINT_INTERVAL
+    assert restarted.balance_ledger.balances['alice'] >= 10 ** 6
+
+
+class LocalPeerClient:
+    """Клиент соседей, отвечающий от имени узлов этого процесса; блоки проходят через JSON, как по сети."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def locate_fork_point(self, node, locator, deadline=None):
+        return self.nodes[node].find_fork_point(locator)
+
+    def fetch_blocks(self, node, from_index, to_index, deadline=None):
+        return json.loads(json.dumps(self.nodes[node].get_chain(from_index)[:to_index - from_index + 1]))
+
+
+def clone(coin, make_node, node, node_id):
+    """Узел с копией журнала блоков node: общий генезис и префикс цепочки."""
+    node.block_log.close()
+    shutil.copytree(node.block_log.directory, os.path.join(coin.CHAIN_DATA_DIR, f"blocks_{node_id}"))
+    return make_node(node_id)
+
+
+def sync(node, peers, peer):
+    fork = node._fetch_fork(peer, len(peers[peer].chain), len(node.chain), time.monotonic() + 10)
+    assert fork is not None
+    return fork
+
+
+def record_truncations(node):
+    """Список высот, до которых обрезается журнал узла."""
+    truncations = []
+    truncate = node.block_log.truncate
+
+    def recording_truncate(height):
+        truncations.append(height)
+        truncate(height)
+
+    node.block_log.truncate = recording_truncate
+    return truncations
+
+
+def log_hashes(node):
+    node.block_log.close()
+    return node.block_log.read_all()[1]
+
+
+def test_fork_extends_chain(coin, make_node):
+    source = make_node('source')
+    mine(source, 2)
+    node = clone(coin, make_node, source, 'node')
+    mine(source, 3)
+    node.peer_client = LocalPeerClient({'source': source})
+    truncations = record_truncations(node)
+
+    fork_point, anchor, blocks, hashes = sync(node, {'source': source}, 'source')
+    assert fork_point == 3 and anchor is node.chain[2] and len(blocks) == 3
+    assert node._adopt_fork(fork_point, anchor, blocks, hashes)
+    assert node.block_hashes == source.block_hashes
+    assert truncations == []
+    assert log_hashes(node) == source.block_hashes
+    assert node.balance_ledger.balances == source.balance_ledger.balances
+
+
+def test_fork_replaces_chain_from_first_differing_block(coin, make_node):
+    source = make_node('source')
+    mine(source, 2)
+    node = clone(coin, make_node, source, 'node')
+    mine(source, 3)
+    # Своя ветка узла: после общего предка (блок 3) у него другой блок
+    mine(node, reward_address='other')
+    node.peer_client = LocalPeerClient({'source': source})
+    truncations = record_truncations(node)
+
+    fork_point, anchor, blocks, hashes = sync(node, {'source': source}, 'source')
+    assert fork_point == 3
+    assert node._adopt_fork(fork_point, anchor, blocks, hashes)
+    assert truncations == [3]
+    assert node.block_hashes == source.block_hashes
+    assert log_hashes(node) == source.block_hashes
+    assert node.balance_ledger.balances == source.balance_ledger.balances
+    assert 'other' not in node.balance_ledger.balances
+
+
+def test_fork_below_common_blocks_truncates_at_first_difference(coin, make_node):
+    source = make_node('source')
+    mine(source, 2)
+    node = clone(coin, make_node, source, 'node')
+    mine(source, 3)
+    mine(node, reward_address='other')
+    truncations = record_truncations(node)
+
+    # Соседу пришлось начать раньше общего предка: совпадающие блоки 2-3 журнал не переписывает
+    blocks = json.loads(json.dumps(source.chain[1:]))
+    assert node._adopt_fork(1, node.chain[0], blocks, source.block_hashes[1:])
+    assert truncations == [3]
+    assert log_hashes(node) == source.block_hashes
+
+
+def test_fork_is_not_adopted_after_chain_changed(coin, make_node):
+    source = make_node('source')
+    rival = clone(coin, make_node, source, 'rival')
+    mine(source)
+    node = clone(coin, make_node, source, 'node')
+    mine(source, 2)
+    mine(rival, 2, reward_address='rival')
+    peers = {'source': source, 'rival': rival}
+    node.peer_client = LocalPeerClient(peers)
+
+    fork = sync(node, peers, 'source')
+    # Пока загружались блоки source, узел перешел на ветку rival, расходящуюся ниже предка
+    assert node._adopt_fork(*sync(node, peers, 'rival'))
+    assert fork[0] == 2 and node.chain[fork[0] - 1] is not fork[1]
+    # Ветка source по-прежнему длиннее: отказ только из-за смены предка
+    assert fork[0] + len(fork[2]) > len(node.chain)
+    hashes = list(node.block_hashes)
+    assert not node._adopt_fork(*fork)
+    assert node.block_hashes == hashes == rival.block_hashes
+    assert log_hashes(node) == rival.block_hashes
+
+
+@pytest.mark.parametrize('same_block', [True, False])
+def test_votes_after_verdict_match_between_live_path_and_replay(make_node, same_block):
+    node = make_node()
+    node.submit_rage_report('alice', 'spam content', 'spam', stake_amount=1)
+    mine(node)
+    report_id, = node.pending_rage_reports
+    for voter, vote_type in (('carol', 'approve'), ('dave', 'approve'), ('erin', 'reject')):
+        node.vote_on_rage_report(voter, report_id, vote_type)
+        if not same_block:
+            mine(node)
+    # Два одобрения решают репорт; голос против после решения уже ни на что не влияет
+    mine(node, 2 if same_block else 1)
+    assert node.pending_rage_reports == {}
+    rewards = [tx for block in node.chain for tx in block['transactions'] if tx['sender'] == 'Rage_Protocol_Reward']
+    assert [(tx['recipient'], tx['data']) for tx in rewards] == [('alice', {'report_id': report_id})]
+    assert node.get_balance('alice') == node.report_reward - 1
+    live = state_of(node)
+    node.block_log.close()
+
+    replayed = make_node(full_verify=True)
+    assert state_of(replayed) == live
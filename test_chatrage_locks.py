@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from chatrage_locks import ReadWriteLock
+
+TIMEOUT = 5
+
+
+def run_in_thread(target):
+    """Запускает target в потоке; возвращает поток и событие, которое выставляется после target."""
+    done = threading.Event()
+
+    def run():
+        target()
+        done.set()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, done
+
+
+def take_and_release(guard):
+    with guard:
+        pass
+
+
+def wait_until_waiting_writer(lock):
+    deadline = time.monotonic() + TIMEOUT
+    while not lock._waiting_writers:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_read_is_reentrant():
+    lock = ReadWriteLock()
+    with lock.read():
+        with lock.read():
+            assert lock._readers[threading.get_ident()] == 2
+        assert lock._readers[threading.get_ident()] == 1
+    assert not lock._readers
+
+
+def test_write_is_reentrant_and_allows_read():
+    lock = ReadWriteLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                assert lock._write_depth == 2
+        assert lock._writer == threading.get_ident()
+    assert lock._writer is None
+    assert not lock._readers
+
+
+def test_upgrade_from_read_is_refused():
+    lock = ReadWriteLock()
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+        assert lock._waiting_writers == 0
+    # Отказ не оставляет следов: другой поток может взять запись
+    thread, done = run_in_thread(lambda: take_and_release(lock.write()))
+    assert done.wait(TIMEOUT)
+
+
+def test_upgrade_refused_in_nested_read():
+    lock = ReadWriteLock()
+    with lock.read():
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                take_and_release(lock.write())
+
+
+def test_release_write_from_other_thread_is_refused():
+    lock = ReadWriteLock()
+    errors = []
+
+    def release():
+        try:
+            lock.release_write()
+        except RuntimeError as e:
+            errors.append(e)
+
+    with lock.write():
+        thread, done = run_in_thread(release)
+        assert done.wait(TIMEOUT)
+        assert lock._writer == threading.get_ident()
+    assert len(errors) == 1
+
+
+def test_writer_excludes_readers():
+    lock = ReadWriteLock()
+    with lock.write():
+        thread, done = run_in_thread(lambda: take_and_release(lock.read()))
+        assert not done.wait(0.05)
+    assert done.wait(TIMEOUT)
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    writer, writer_done = run_in_thread(lambda: take_and_release(lock.write()))
+    wait_until_waiting_writer(lock)
+    reader, reader_done = run_in_thread(lambda: take_and_release(lock.read()))
+    assert not reader_done.wait(0.05)
+    # Уже читающий поток может читать повторно, иначе он заблокировал бы сам себя
+    take_and_release(lock.read())
+    lock.release_read()
+    assert writer_done.wait(TIMEOUT)
+    assert reader_done.wait(TIMEOUT)
@@ -0,0 +1,99 @@
+from chatrage_mempool import Mempool, canonical_transaction_bytes, transaction_id, validate_transaction
+
+
+def transfer(number, sender='alice'):
+    return {'type': 'transfer', 'sender': sender, 'recipient': 'bob', 'amount': 1,
+            'data': None, 'nonce': f'{number:04d}'}
+
+
+def reward(number):
+    return {'type': 'transfer', 'sender': '0', 'recipient': 'miner', 'amount': 1,
+            'data': {'block_index': number}}
+
+
+def ids(pool):
+    return [tx_id for tx_id, _ in pool.items()]
+
+
+def test_mempool_deduplicates():
+    pool = Mempool()
+    tx_id, added = pool.add(transfer(1))
+    assert added
+    assert pool.add(transfer(1)) == (tx_id, False)
+    assert len(pool) == 1
+    assert tx_id == transaction_id(transfer(1))
+
+
+def test_mempool_evicts_oldest_first():
+    pool = Mempool(max_count=3)
+    added = [pool.add(transfer(number))[0] for number in range(5)]
+    assert ids(pool) == added[2:]
+    assert pool.evicted == 2
+
+
+def test_mempool_keeps_priority_transactions_on_eviction():
+    pool = Mempool(max_count=3)
+    first = pool.add(transfer(0))[0]
+    protected = pool.add(reward(1), priority=True)[0]
+    later = [pool.add(transfer(number))[0] for number in range(1, 4)]
+    assert first not in pool
+    assert protected in pool
+    assert ids(pool) == [protected] + later[1:]
+
+
+def test_mempool_evicts_by_bytes():
+    size = len(canonical_transaction_bytes(transfer(0)))
+    pool = Mempool(max_bytes=size * 2)
+    added = [pool.add(transfer(number))[0] for number in range(3)]
+    assert ids(pool) == added[1:]
+    assert pool.total_bytes == size * 2
+
+
+def test_mempool_eviction_updates_sender_index():
+    pool = Mempool(max_count=1)
+    pool.add(transfer(0, sender='carol'))
+    pool.add(transfer(1))
+    assert pool.by_sender('carol') == []
+    assert len(pool.by_sender('alice')) == 1
+
+
+def test_template_puts_priority_first_and_keeps_arrival_order():
+    pool = Mempool()
+    regular = [pool.add(transfer(number))[0] for number in range(3)]
+    protected = pool.add(reward(1), priority=True)[0]
+    assert [tx_id for tx_id, _ in pool.build_template()] == [protected] + regular
+
+
+def test_template_count_limit():
+    pool = Mempool()
+    added = [pool.add(transfer(number))[0] for number in range(5)]
+    assert [tx_id for tx_id, _ in pool.build_template(max_count=2)] == added[:2]
+
+
+def test_template_byte_limit_stops_without_skipping():
+    pool = Mempool()
+    small = pool.add(transfer(0))[0]
+    pool.add(dict(transfer(1), data={'memo': 'x' * 500}))
+    pool.add(transfer(2))
+    limit = len(canonical_transaction_bytes(transfer(0))) * 2
+    # Следующая транзакция не помещается: более поздние, хоть и маленькие, в шаблон не берутся
+    assert [tx_id for tx_id, _ in pool.build_template(max_bytes=limit)] == [small]
+
+
+def test_remove_and_report_index():
+    pool = Mempool()
+    report = {'type': 'rage_report', 'sender': 'alice', 'recipient': None, 'amount': 0,
+              'data': {'report_id': 'r1', 'content_hash': 'c', 'reason_code': 'spam',
+                       'reporter_address': 'alice', 'stake_amount': 1}}
+    assert validate_transaction(report) is None
+    tx_id = pool.add(report)[0]
+    assert pool.get_report('r1') == (tx_id, report)
+    pool.remove([tx_id])
+    assert pool.get_report('r1') is None
+    assert len(pool) == 0 and pool.total_bytes == 0
+
+
+def test_validate_rejects_integers_msgpack_cannot_store():
+    assert validate_transaction(dict(transfer(0), amount=10 ** 30)) is not None
+    assert validate_transaction(dict(transfer(0), data={'memo': [1, -2 ** 64]})) is not None
+    assert validate_transaction(dict(transfer(0), amount=2 ** 64 - 1)) is None
@@ -0,0 +1,55 @@
+import pytest
+
+from chatrage_merkle import EMPTY_ROOT, merkle_proof, merkle_root, verify_merkle_proof
+
+SIZES = [1, 2, 3, 5, 6, 7, 9, 11, 13, 16, 17]
+
+
+def make_transactions(count):
+    return [{'type': 'transfer', 'sender': 'alice', 'recipient': 'bob', 'amount': number, 'data': None}
+            for number in range(count)]
+
+
+@pytest.mark.parametrize('count', SIZES)
+def test_proof_verifies_for_every_position(count):
+    transactions = make_transactions(count)
+    root = merkle_root(transactions)
+    for position, tx in enumerate(transactions):
+        assert verify_merkle_proof(tx, merkle_proof(transactions, position), root), position
+
+
+@pytest.mark.parametrize('count', [size for size in SIZES if size > 1])
+def test_proof_rejects_other_transaction(count):
+    transactions = make_transactions(count)
+    root = merkle_root(transactions)
+    for position in range(count):
+        proof = merkle_proof(transactions, position)
+        other = transactions[(position + 1) % count]
+        assert not verify_merkle_proof(other, proof, root)
+        assert not verify_merkle_proof(transactions[position], proof, merkle_root(transactions[:-1]))
+
+
+def test_unpaired_last_leaf_is_not_duplicated():
+    transactions = make_transactions(3)
+    # Дублирование последнего листа (как в Bitcoin) дало бы тот же корень для [a, b, c, c]
+    assert merkle_root(transactions) != merkle_root(transactions + transactions[-1:])
+    assert len(merkle_proof(transactions, 2)) == 1
+
+
+def test_tampered_proof_is_rejected():
+    transactions = make_transactions(5)
+    root = merkle_root(transactions)
+    proof = merkle_proof(transactions, 1)
+    flipped = [dict(step, side='left' if step['side'] == 'right' else 'right') for step in proof]
+    assert not verify_merkle_proof(transactions[1], flipped, root)
+    assert not verify_merkle_proof(transactions[1], [dict(proof[0], side='up')] + proof[1:], root)
+    assert not verify_merkle_proof(transactions[1], [{'hash': 'zz', 'side': 'left'}], root)
+    assert not verify_merkle_proof(transactions[1], [{'side': 'left'}], root)
+
+
+def test_empty_block_and_bad_position():
+    assert merkle_root([]) == EMPTY_ROOT
+    with pytest.raises(IndexError):
+        merkle_proof(make_transactions(3), 3)
+    with pytest.raises(IndexError):
+        merkle_proof(make_transactions(3), -1)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from chatrage_codec import msgpack_available
+from chatrage_storage import RECORD_HEADER, BlockLog
+
+CODECS = ['json'] + (['msgpack'] if msgpack_available() else [])
+
+
+def make_block(index):
+    return {'index': index, 'timestamp': 1000.0 + index, 'transactions': [], 'proof': index, 'previous_hash': 'h'}
+
+
+def write_blocks(directory, count, codec, **kwargs):
+    log = BlockLog(directory, codec=codec, **kwargs)
+    for index in range(1, count + 1):
+        log.append(make_block(index))
+    log.close()
+    return log
+
+
+def segment_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_block_log_round_trip(tmp_path, codec):
+    write_blocks(str(tmp_path), 3, codec)
+    blocks, hashes = BlockLog(str(tmp_path), codec=codec).read_all()
+    assert blocks == [make_block(index) for index in (1, 2, 3)]
+    assert len(set(hashes)) == 3
+
+
+@pytest.mark.parametrize('codec', CODECS)
+@pytest.mark.parametrize('cut', [1, RECORD_HEADER.size - 1, RECORD_HEADER.size + 1])
+def test_block_log_drops_torn_tail(tmp_path, codec, cut):
+    write_blocks(str(tmp_path), 3, codec)
+    path, = segment_files(str(tmp_path))
+    reader = BlockLog(str(tmp_path), codec=codec)
+    reader.read_all()
+    last_offset = reader._positions[-1][1]
+    # Обрываем последнюю запись на середине заголовка или данных
+    with open(path, 'r+b') as f:
+        f.truncate(last_offset + cut)
+
+    log = BlockLog(str(tmp_path), codec=codec)
+    blocks, _ = log.read_all()
+    assert blocks == [make_block(1), make_block(2)]
+    assert os.path.getsize(path) == last_offset
+
+    # После восстановления журнал дописывается с места обрыва
+    log.append(make_block(3))
+    log.close()
+    blocks, _ = BlockLog(str(tmp_path), codec=codec).read_all()
+    assert blocks == [make_block(index) for index in (1, 2, 3)]
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_block_log_drops_corrupted_record_and_later_segments(tmp_path, codec):
+    # Маленький сегмент: каждая запись в своем файле
+    write_blocks(str(tmp_path), 4, codec, segment_max_bytes=1)
+    paths = segment_files(str(tmp_path))
+    assert len(paths) == 4
+    with open(paths[1], 'r+b') as f:
+        f.seek(RECORD_HEADER.size)
+        first = f.read(1)
+        f.seek(RECORD_HEADER.size)
+        f.write(bytes([first[0] ^ 0xff]))
+
+    blocks, _ = BlockLog(str(tmp_path), codec=codec).read_all()
+    assert blocks == [make_block(1)]
+    assert segment_files(str(tmp_path)) == paths[:2]
+    assert os.path.getsize(paths[1]) == 0
+
+
+def test_block_log_truncate(tmp_path):
+    log = write_blocks(str(tmp_path), 5, 'json')
+    log.read_all()
+    log.truncate(2)
+    log.append(make_block(3))
+    log.close()
+    blocks, _ = BlockLog(str(tmp_path)).read_all()
+    assert blocks == [make_block(1), make_block(2), make_block(3)]